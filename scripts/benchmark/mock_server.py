@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+Mock HubSpot / PostHog / Athena / S3 server for benchmarking the sync scripts
+
+Serves synthetic data generated on the fly, so any volume can be served
+without storing it:
+1. HubSpot CRM list, search and batch read endpoints, pipelines and owners
+2. PostHog HogQL event queries (counts and keyset-paginated pages) and persons
+3. Athena query executions whose CSV or UNLOAD Parquet results are written
+   with DuckDB and served through a minimal S3 API (HEAD, ranged GET, list)
+
+Every response is delayed by the configured latency, and HubSpot / PostHog
+requests are answered with 429 at the configured rate.
+
+Usage:
+    python scripts/benchmark/mock_server.py [--rows 100000] [--latency-ms 20] [--error-rate 0.01] [--port 8765]
+
+Point the sync scripts at it with:
+    HUBSPOT_BASE_URL=http://127.0.0.1:8765
+    POSTHOG_HOST=http://127.0.0.1:8765
+    AWS_ENDPOINT_URL_ATHENA=http://127.0.0.1:8765
+    AWS_ENDPOINT_URL_S3=http://127.0.0.1:8765
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import duckdb
+
+# Synthetic data layout. Events stay inside the default 7-day export range
+# even if the export starts a while after the server was configured.
+HUBSPOT_HISTORY = timedelta(days=365)
+EVENT_HISTORY = timedelta(days=6)
+PARQUET_ROWS_PER_PART = 1_000_000
+OWNER_IDS = ["101", "102", "103", "104", "105"]
+LIFECYCLE_STAGES = ["subscriber", "lead", "marketingqualifiedlead", "salesqualifiedlead",
+                    "opportunity", "customer"]
+DEAL_STAGES = [
+    ("appointmentscheduled", "Appointment Scheduled", "false", "0.2"),
+    ("qualifiedtobuy", "Qualified To Buy", "false", "0.4"),
+    ("contractsent", "Contract Sent", "false", "0.8"),
+    ("closedwon", "Closed Won", "true", "1.0"),
+    ("closedlost", "Closed Lost", "true", "0.0"),
+]
+EVENT_NAMES = ["$pageview", "$autocapture", "signed_up", "purchase"]
+
+# Rows of every Athena result; `rows` of them are generated per query
+ATHENA_RESULT_SQL = """
+    SELECT range AS id,
+           DATE '2024-01-01' + CAST(range % 365 AS INTEGER) AS event_date,
+           'category_' || (range % 20) AS category,
+           round((range * 7919) % 100000 / 100.0, 2) AS amount
+    FROM range({rows})
+"""
+
+
+def iso_timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.rstrip("Z").replace(" ", "T"))
+
+def index_uuid(index: int) -> str:
+    """UUID of the `index`-th synthetic record; sorts in index order."""
+    return str(uuid.UUID(int=index))
+
+
+class MockState:
+    """Configuration, synthetic data and request counters shared by all handlers."""
+
+    def __init__(self, rows: int = 10000, latency: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 0.1, query_seconds: float = 0.0, work_dir: str = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.query_seconds = query_seconds
+        self.work_dir = Path(work_dir or tempfile.mkdtemp(prefix="mock_s3_"))
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.s3_objects = {}
+        self.executions = {}
+        self.configure(rows)
+        self.reset_counters()
+
+    def configure(self, rows: int):
+        """Serve `rows` records per object type, event stream and query result."""
+        self.rows = rows
+        now = datetime.utcnow().replace(microsecond=0)
+        self.crm_start = now - HUBSPOT_HISTORY
+        self.crm_step = HUBSPOT_HISTORY / rows
+        # Event timestamps are whole microseconds apart and unique
+        self.event_start = now - EVENT_HISTORY
+        self.event_step_us = max(1, int(EVENT_HISTORY.total_seconds() * 1_000_000) // rows)
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = Counter()
+            self.throttled = 0
+
+    def record(self, api: str) -> bool:
+        """Count a request to `api`; returns True when it should be throttled."""
+        with self._lock:
+            self.requests[api] += 1
+            if api in ("hubspot", "posthog") and self._random.random() < self.error_rate:
+                self.throttled += 1
+                return True
+        return False
+
+    def counters(self) -> dict:
+        with self._lock:
+            return {"requests": sum(self.requests.values()), "throttled": self.throttled,
+                    "by_api": dict(self.requests)}
+
+    # ----------------------------------------
+    # HubSpot
+    # ----------------------------------------
+
+    def crm_modified(self, index: int) -> datetime:
+        return self.crm_start + self.crm_step * index
+
+    def crm_object(self, object_type: str, index: int) -> dict:
+        created = iso_timestamp(self.crm_modified(index))
+        modified = iso_timestamp(self.crm_modified(index))
+        if object_type == "contacts":
+            properties = {
+                "email": f"contact{index}@example.com",
+                "firstname": f"First{index}",
+                "lastname": f"Last{index}",
+                "lifecyclestage": LIFECYCLE_STAGES[index % len(LIFECYCLE_STAGES)],
+                "createdate": created,
+                "lastmodifieddate": modified,
+            }
+        elif object_type == "companies":
+            properties = {
+                "name": f"Company {index}",
+                "domain": f"company{index}.example.com",
+                "industry": "COMPUTER_SOFTWARE",
+                "createdate": created,
+                "hs_lastmodifieddate": modified,
+            }
+        else:
+            properties = {
+                "dealname": f"Deal {index}",
+                "amount": str((index * 7919) % 100000),
+                "dealstage": DEAL_STAGES[index % len(DEAL_STAGES)][0],
+                "pipeline": "default",
+                "hubspot_owner_id": OWNER_IDS[index % len(OWNER_IDS)],
+                "createdate": created,
+                "hs_lastmodifieddate": modified,
+            }
+        properties["hs_object_id"] = str(index + 1)
+        return {"id": str(index + 1), "properties": properties, "createdAt": created,
+                "updatedAt": modified, "archived": False}
+
+    def crm_page(self, object_type: str, start: int, limit: int, offset: int = 0) -> dict:
+        """Objects `start + offset` onwards, with the `after` cursor of the next page."""
+        first = start + offset
+        last = min(first + limit, self.rows)
+        page = {"results": [self.crm_object(object_type, i) for i in range(first, last)]}
+        if last < self.rows:
+            page["paging"] = {"next": {"after": str(offset + limit)}}
+        return page
+
+    def crm_search(self, object_type: str, body: dict) -> dict:
+        since_ms = 0
+        for group in body.get("filterGroups", []):
+            for f in group.get("filters", []):
+                if f.get("operator") == "GTE":
+                    since_ms = int(f["value"])
+        since = datetime(1970, 1, 1) + timedelta(milliseconds=since_ms)
+        start = max(0, math.ceil((since - self.crm_start) / self.crm_step))
+        return self.crm_page(object_type, start, int(body.get("limit", 100)), int(body.get("after", 0)))
+
+    def crm_batch_read(self, object_type: str, body: dict) -> dict:
+        results = []
+        for item in body.get("inputs", []):
+            index = int(item["id"]) - 1
+            obj = self.crm_object(object_type, index)
+            if body.get("propertiesWithHistory"):
+                entered = self.crm_modified(index)
+                obj["propertiesWithHistory"] = {"dealstage": [
+                    {"value": obj["properties"].get("dealstage"), "timestamp": iso_timestamp(entered)},
+                    {"value": DEAL_STAGES[0][0], "timestamp": iso_timestamp(entered - timedelta(days=3))},
+                ]}
+            results.append(obj)
+        return {"status": "COMPLETE", "results": results}
+
+    def pipelines(self) -> dict:
+        return {"results": [{
+            "id": "default",
+            "label": "Sales Pipeline",
+            "stages": [{"id": stage_id, "label": label, "displayOrder": i,
+                        "metadata": {"isClosed": closed, "probability": probability}}
+                       for i, (stage_id, label, closed, probability) in enumerate(DEAL_STAGES)]
+        }]}
+
+    def owners(self) -> dict:
+        return {"results": [{"id": owner_id, "email": f"owner{owner_id}@example.com",
+                             "firstName": "Owner", "lastName": owner_id, "userId": int(owner_id)}
+                            for owner_id in OWNER_IDS]}
+
+    # ----------------------------------------
+    # PostHog
+    # ----------------------------------------
+
+    def event_index(self, timestamp: str, inclusive: bool) -> int:
+        """Index of the first event at (or, if not `inclusive`, after) `timestamp`."""
+        offset = parse_timestamp(timestamp) - self.event_start
+        offset_us = (offset.days * 86400 + offset.seconds) * 1_000_000 + offset.microseconds
+        index = -(-offset_us // self.event_step_us) if inclusive else offset_us // self.event_step_us + 1
+        return min(max(index, 0), self.rows)
+
+    def event_value(self, column: str, index: int):
+        timestamp = self.event_start + timedelta(microseconds=index * self.event_step_us)
+        return {
+            "uuid": index_uuid(index),
+            "event": EVENT_NAMES[index % len(EVENT_NAMES)],
+            "distinct_id": f"user{index % 5000}",
+            "properties": json.dumps({"$current_url": f"https://example.com/page/{index % 100}",
+                                      "$browser": "Chrome"}),
+            "timestamp": iso_timestamp(timestamp),
+            "person_id": index_uuid(10**12 + index % 5000),
+        }.get(column)
+
+    def hogql(self, query: str) -> dict:
+        start = re.search(r"timestamp >= '([^']+)'", query)
+        end = re.search(r"timestamp < '([^']+)'", query)
+        after = re.search(r"timestamp > '([^']+)'", query)
+        first = self.event_index(start.group(1), inclusive=True) if start else 0
+        last = self.event_index(end.group(1), inclusive=True) if end else self.rows
+        if after:
+            first = max(first, self.event_index(after.group(1), inclusive=False))
+
+        if re.search(r"SELECT\s+count\(\)", query, re.IGNORECASE):
+            return {"results": [[max(0, last - first)]]}
+
+        limit = re.search(r"LIMIT\s+(\d+)", query, re.IGNORECASE)
+        if limit:
+            last = min(last, first + int(limit.group(1)))
+        columns = [c.strip() for c in re.search(r"SELECT\s+(.*?)\s+FROM", query, re.S | re.I).group(1).split(",")]
+        return {"columns": columns,
+                "results": [[self.event_value(c, i) for c in columns] for i in range(first, last)]}
+
+    def persons(self, base_url: str, limit: int, offset: int) -> dict:
+        last = min(offset + limit, self.rows)
+        results = [{
+            "id": index_uuid(10**12 + i),
+            "uuid": index_uuid(10**12 + i),
+            "distinct_ids": [f"user{i}"],
+            "properties": {"email": f"user{i}@example.com", "plan": "free" if i % 3 else "paid"},
+            "created_at": iso_timestamp(self.crm_modified(i)),
+        } for i in range(offset, last)]
+        next_url = f"{base_url}?limit={limit}&offset={last}" if last < self.rows else None
+        return {"results": results, "next": next_url}
+
+    # ----------------------------------------
+    # Athena / S3
+    # ----------------------------------------
+
+    def start_query(self, body: dict) -> dict:
+        execution_id = uuid.uuid4().hex
+        query = body["QueryString"]
+        output = body.get("ResultConfiguration", {}).get("OutputLocation", "s3://mock-results/")
+        rows_sql = ATHENA_RESULT_SQL.format(rows=self.rows)
+        con = duckdb.connect()
+
+        unload = re.search(r"\bTO\s+'s3://([^/']+)/([^']*)'", query) if query.lstrip().upper().startswith("UNLOAD") else None
+        if unload:
+            bucket, prefix = unload.groups()
+            for part, first in enumerate(range(0, max(self.rows, 1), PARQUET_ROWS_PER_PART)):
+                path = self.work_dir / f"{execution_id}-{part:05d}.parquet"
+                con.execute(f"COPY (SELECT * FROM ({rows_sql}) WHERE id >= {first} AND id < {first + PARQUET_ROWS_PER_PART}) "
+                            f"TO '{path}' (FORMAT PARQUET)")
+                self.s3_objects[f"{bucket}/{prefix}{execution_id}_{part:05d}"] = path
+            location = f"s3://{bucket}/{prefix}"
+        else:
+            bucket, _, prefix = output.replace("s3://", "").partition("/")
+            path = self.work_dir / f"{execution_id}.csv"
+            con.execute(f"COPY ({rows_sql}) TO '{path}' (HEADER, FORCE_QUOTE *)")
+            self.s3_objects[f"{bucket}/{prefix}{execution_id}.csv"] = path
+            location = f"s3://{bucket}/{prefix}{execution_id}.csv"
+        con.close()
+
+        self.executions[execution_id] = {"location": location, "ready_at": time.time() + self.query_seconds,
+                                         "query": query}
+        return {"QueryExecutionId": execution_id}
+
+    def query_execution(self, execution_id: str) -> dict:
+        execution = self.executions[execution_id]
+        state = "SUCCEEDED" if time.time() >= execution["ready_at"] else "RUNNING"
+        return {
+            "QueryExecutionId": execution_id,
+            "Query": execution["query"],
+            "Status": {"State": state},
+            "ResultConfiguration": {"OutputLocation": execution["location"]},
+            "Statistics": {"ResultReuseInformation": {"ReusedPreviousResult": False}},
+        }
+
+    def list_objects(self, bucket: str, prefix: str) -> str:
+        keys = sorted(k.split("/", 1)[1] for k in self.s3_objects if k.startswith(f"{bucket}/{prefix}"))
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{os.path.getsize(self.s3_objects[f'{bucket}/{key}'])}</Size>"
+            f"<ETag>\"{abs(hash(key))}\"</ETag><StorageClass>STANDARD</StorageClass></Contents>"
+            for key in keys
+        )
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+                f"<KeyCount>{len(keys)}</KeyCount><MaxKeys>1000</MaxKeys>"
+                f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Route requests to the HubSpot, PostHog, Athena or S3 stand-ins."""
+
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_HEAD(self):
+        self.dispatch("HEAD")
+
+    def send(self, status: int, body=b"", content_type: str = "application/json", headers: dict = None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def dispatch(self, method: str):
+        state = self.state
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if self.headers.get("X-Amz-Target", "").startswith("AmazonAthena."):
+            api = "athena"
+        elif url.path.startswith("/crm/"):
+            api = "hubspot"
+        elif url.path.startswith("/api/projects/"):
+            api = "posthog"
+        else:
+            api = "s3"
+
+        if state.latency:
+            time.sleep(state.latency)
+        body = self.read_json() if method == "POST" and api != "s3" else {}
+        if state.record(api):
+            self.send(429, {"status": "error", "message": "Rate limit exceeded"},
+                      headers={"Retry-After": str(state.retry_after)})
+            return
+
+        try:
+            getattr(self, f"handle_{api}")(method, url.path, params, body)
+        except KeyError as e:
+            self.send(404, {"message": f"Not found: {e}"})
+
+    def handle_hubspot(self, method, path, params, body):
+        state = self.state
+        parts = path.strip("/").split("/")
+        if path == "/crm/v3/pipelines/deals":
+            self.send(200, state.pipelines())
+        elif path == "/crm/v3/owners":
+            self.send(200, state.owners())
+        elif len(parts) == 4 and parts[2] == "objects":
+            self.send(200, state.crm_page(parts[3], 0, int(params.get("limit", 100)),
+                                          int(params.get("after", 0))))
+        elif len(parts) == 5 and parts[4] == "search":
+            self.send(200, state.crm_search(parts[3], body))
+        elif len(parts) == 6 and parts[4:] == ["batch", "read"]:
+            self.send(200, state.crm_batch_read(parts[3], body))
+        else:
+            self.send(404, {"message": f"Unsupported endpoint {method} {path}"})
+
+    def handle_posthog(self, method, path, params, body):
+        state = self.state
+        if path.endswith("/query") or path.endswith("/query/"):
+            self.send(200, state.hogql(body["query"]["query"]))
+        elif path.rstrip("/").endswith("/persons"):
+            base_url = f"http://{self.headers['Host']}{path}"
+            self.send(200, state.persons(base_url, int(params.get("limit", 100)),
+                                         int(params.get("offset", 0))))
+        else:
+            self.send(200, {"results": []})
+
+    def handle_athena(self, method, path, params, body):
+        state = self.state
+        operation = self.headers["X-Amz-Target"].split(".", 1)[1]
+        if operation == "StartQueryExecution":
+            response = state.start_query(body)
+        elif operation == "GetQueryExecution":
+            response = {"QueryExecution": state.query_execution(body["QueryExecutionId"])}
+        elif operation == "BatchGetQueryExecution":
+            response = {"QueryExecutions": [state.query_execution(i) for i in body["QueryExecutionIds"]],
+                        "UnprocessedQueryExecutionIds": []}
+        else:
+            response = {}
+        self.send(200, response, content_type="application/x-amz-json-1.1")
+
+    def handle_s3(self, method, path, params, body):
+        state = self.state
+        bucket, _, key = path.lstrip("/").partition("/")
+        if not key:
+            self.send(200, state.list_objects(bucket, params.get("prefix", "")), content_type="application/xml")
+            return
+
+        local = state.s3_objects.get(f"{bucket}/{key}")
+        if local is None:
+            self.send(404, "<Error><Code>NoSuchKey</Code></Error>", content_type="application/xml")
+            return
+
+        size = os.path.getsize(local)
+        headers = {"ETag": f'"{abs(hash(key))}"', "Last-Modified": formatdate(usegmt=True),
+                   "Accept-Ranges": "bytes"}
+        start, end, status = 0, size - 1, 200
+        byte_range = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if byte_range and method == "GET":
+            start = int(byte_range.group(1))
+            end = min(int(byte_range.group(2) or size - 1), size - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            status = 206
+
+        if method == "HEAD":
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        with open(local, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        self.send(status, data, content_type="application/octet-stream", headers=headers)
+
+
+def start_server(state: MockState, port: int = 0) -> ThreadingHTTPServer:
+    """Serve `state` on 127.0.0.1 from a background thread."""
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock HubSpot / PostHog / Athena / S3 server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="Records per CRM object, events, persons and rows per query result")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="Fraction of HubSpot / PostHog requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of 429 responses (seconds)")
+    parser.add_argument("--query-seconds", type=float, default=0, help="Time each Athena query stays RUNNING")
+    args = parser.parse_args()
+
+    state = MockState(args.rows, args.latency_ms / 1000, args.error_rate, args.retry_after, args.query_seconds)
+    server = start_server(state, args.port)
+    print(f"Mock server listening on http://127.0.0.1:{server.server_address[1]} ({args.rows} rows)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
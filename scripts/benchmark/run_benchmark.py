@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Sync Benchmark
+
+Runs the sync paths against the local mock server (see mock_server.py) and
+reports, per path and volume:
+- wall time and rows/sec of the sync itself
+- peak RSS of the process running it
+- requests served by the mock server and how many were throttled
+
+Each sync runs in a fresh subprocess with an empty data directory, so RSS
+and caches are not shared between runs.
+
+Usage:
+    python scripts/benchmark/run_benchmark.py [--targets hubspot,athena_csv] [--rows 10000,100000]
+                                              [--latency-ms 20] [--error-rate 0.01] [--json results.json]
+
+Targets:
+    hubspot           sync_data (contacts, companies, deals, pipelines, owners)
+    posthog_events    sync_events (7-day full export)
+    posthog_persons   sync_persons
+    athena_csv        sync_athena main, CSV results
+    athena_parquet    sync_athena main, UNLOAD to Parquet
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+
+from mock_server import MockState, start_server
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+TARGETS = ["hubspot", "posthog_events", "posthog_persons", "athena_csv", "athena_parquet"]
+
+BENCHMARK_QUERY = """-- Benchmark query
+select * from benchmark_facts
+"""
+
+
+# ----------------------------------------
+# Child process: run one sync path
+# ----------------------------------------
+
+def count_rows(db_path: Path, tables: list) -> int:
+    import duckdb
+    con = duckdb.connect(str(db_path), read_only=True)
+    total = sum(con.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for t in tables)
+    con.close()
+    return total
+
+def run_hubspot(base_url: str, data_dir: Path, rows: int) -> int:
+    os.environ["HUBSPOT_BASE_URL"] = base_url
+    os.environ.setdefault("HUBSPOT_RATE_LIMIT_PER_SECOND", "100000")
+    os.environ.setdefault("HUBSPOT_RATE_LIMIT_PER_DAY", str(10**9))
+    import hubspot
+    hubspot.DATA_DIR = data_dir
+    hubspot.DUCKDB_PATH = data_dir / 'hubspot_cache.duckdb'
+    hubspot.STAGING_PATH = data_dir / 'hubspot_staging.duckdb'
+    hubspot.sync_data(hubspot.HubSpotClient("benchmark"), full=True)
+    return count_rows(hubspot.DUCKDB_PATH, ["contacts", "companies", "deals"])
+
+def posthog_module(base_url: str, data_dir: Path):
+    os.environ.update(POSTHOG_HOST=base_url, POSTHOG_API_KEY="benchmark", POSTHOG_PROJECT_ID="1")
+    import sync_posthog
+    sync_posthog.DATA_DIR = data_dir
+    sync_posthog.DUCKDB_PATH = data_dir / 'posthog_cache.duckdb'
+    sync_posthog.STAGING_PATH = data_dir / 'posthog_staging.duckdb'
+    return sync_posthog
+
+def run_posthog_events(base_url: str, data_dir: Path, rows: int) -> int:
+    sync_posthog = posthog_module(base_url, data_dir)
+    sync_posthog.sync_events(sync_posthog.get_config(), days_back=7, full=True)
+    return count_rows(sync_posthog.DUCKDB_PATH, ["posthog_events"])
+
+def run_posthog_persons(base_url: str, data_dir: Path, rows: int) -> int:
+    sync_posthog = posthog_module(base_url, data_dir)
+    sync_posthog.sync_persons(sync_posthog.get_config(), limit=rows)
+    return count_rows(sync_posthog.DUCKDB_PATH, ["posthog_persons"])
+
+def run_athena(base_url: str, data_dir: Path, rows: int, parquet: bool) -> int:
+    os.environ.update(
+        AWS_ACCESS_KEY_ID="benchmark", AWS_SECRET_ACCESS_KEY="benchmark", AWS_REGION="us-east-1",
+        AWS_ENDPOINT_URL_ATHENA=base_url, AWS_ENDPOINT_URL_S3=base_url,
+        ATHENA_OUTPUT_BUCKET="s3://benchmark-results/", ATHENA_DATABASE="benchmark"
+    )
+    import sync_athena
+    sources_dir = data_dir / 'sources'
+    sources_dir.mkdir()
+    (sources_dir / 'benchmark_facts.sql').write_text(BENCHMARK_QUERY)
+    sync_athena.SOURCES_DIR = sources_dir
+    sync_athena.DATA_DIR = data_dir
+    sync_athena.DUCKDB_PATH = data_dir / 'athena_cache.duckdb'
+    sync_athena.QUERY_CACHE_PATH = data_dir / 'athena_query_cache.json'
+    sys.argv = ['sync_athena.py', '--force'] + (['--parquet'] if parquet else [])
+    sync_athena.main()
+    return count_rows(sync_athena.DUCKDB_PATH, ["benchmark_facts"])
+
+def run_target(target: str, base_url: str, data_dir: Path, rows: int) -> int:
+    """Run one sync path and return the number of rows it loaded."""
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    if target == "hubspot":
+        return run_hubspot(base_url, data_dir, rows)
+    if target == "posthog_events":
+        return run_posthog_events(base_url, data_dir, rows)
+    if target == "posthog_persons":
+        return run_posthog_persons(base_url, data_dir, rows)
+    if target in ("athena_csv", "athena_parquet"):
+        return run_athena(base_url, data_dir, rows, parquet=target == "athena_parquet")
+    raise ValueError(f"Unknown target: {target}")
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def child_main(args):
+    start = time.perf_counter()
+    rows_loaded = run_target(args.child, args.base_url, Path(args.data_dir), args.child_rows)
+    wall = time.perf_counter() - start
+    Path(args.result).write_text(json.dumps({
+        "rows_loaded": rows_loaded,
+        "wall_seconds": round(wall, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }))
+
+
+# ----------------------------------------
+# Parent process: serve data and collect results
+# ----------------------------------------
+
+def benchmark(state: MockState, base_url: str, target: str, rows: int, verbose: bool = False) -> dict:
+    """Run `target` once in a subprocess against `rows` rows of mock data."""
+    state.configure(rows)
+    state.reset_counters()
+
+    with tempfile.TemporaryDirectory(prefix=f"bench_{target}_") as data_dir:
+        result_path = Path(data_dir) / 'result.json'
+        command = [sys.executable, __file__, '--child', target, '--base-url', base_url,
+                   '--data-dir', data_dir, '--child-rows', str(rows), '--result', str(result_path)]
+        output = None if verbose else subprocess.DEVNULL
+        completed = subprocess.run(command, stdout=output, stderr=None if verbose else subprocess.PIPE)
+
+        result = {"target": target, "rows": rows, **state.counters()}
+        if completed.returncode != 0 or not result_path.exists():
+            error = completed.stderr.decode(errors='replace').strip().splitlines() if completed.stderr else []
+            result["error"] = error[-1] if error else f"exit code {completed.returncode}"
+            return result
+
+        result.update(json.loads(result_path.read_text()))
+
+    result["rows_per_second"] = round(result["rows_loaded"] / result["wall_seconds"]) if result["wall_seconds"] else None
+    return result
+
+def print_results(results: list):
+    header = f"{'target':<16} {'rows':>9} {'loaded':>9} {'wall s':>8} {'rows/s':>9} {'RSS MB':>8} {'requests':>9} {'429s':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['target']:<16} {r['rows']:>9}  FAILED: {r['error']}")
+            continue
+        print(f"{r['target']:<16} {r['rows']:>9} {r['rows_loaded']:>9} {r['wall_seconds']:>8.2f} "
+              f"{r['rows_per_second']:>9} {r['peak_rss_mb']:>8.1f} {r['requests']:>9} {r['throttled']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync scripts against a mock server")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"Comma-separated targets ({', '.join(TARGETS)})")
+    parser.add_argument("--rows", default="10000",
+                        help="Comma-separated volumes, rows per object / event stream / query result")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every mock response")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="Fraction of HubSpot / PostHog requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of 429 responses (seconds)")
+    parser.add_argument("--query-seconds", type=float, default=0, help="Time each Athena query stays RUNNING")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the sync scripts' output")
+
+    # Internal: run a single target in the child process
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        print(f"Unknown targets: {', '.join(unknown)}")
+        print(f"Available targets: {', '.join(TARGETS)}")
+        sys.exit(1)
+    volumes = [int(v) for v in args.rows.split(",")]
+
+    state = MockState(volumes[0], args.latency_ms / 1000, args.error_rate, args.retry_after, args.query_seconds)
+    server = start_server(state)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Mock server on {base_url}")
+
+    results = []
+    for rows in volumes:
+        for target in targets:
+            print(f"Running {target} with {rows} rows...")
+            results.append(benchmark(state, base_url, target, rows, args.verbose))
+
+    server.shutdown()
+
+    print()
+    print_results(results)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,555 @@
+"""
+DuckDB helpers shared by the sync scripts.
+
+Rows are streamed into DuckDB in batches as they are fetched instead of
+being accumulated in memory and loaded at the end.
+"""
+
+import os
+import json
+import time
+import tempfile
+import duckdb
+from contextlib import contextmanager
+from datetime import date
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for use in SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def infer_column_type(value) -> str:
+    """Pick a DuckDB column type for a Python value."""
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        return "BIGINT"
+    if isinstance(value, float):
+        return "DOUBLE"
+    if isinstance(value, (dict, list)):
+        return "JSON"
+    return "VARCHAR"
+
+def database_dir(con) -> str:
+    """Directory of the database file behind `con`, or the temp directory in memory."""
+    path = con.execute(
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+    ).fetchone()[0]
+    return os.path.dirname(os.path.abspath(path)) if path else tempfile.gettempdir()
+
+def table_exists(con, table_name: str) -> bool:
+    """Check whether a table exists in the main schema of the current database."""
+    row = con.execute(
+        "SELECT count(*) FROM information_schema.tables "
+        "WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = ?",
+        [table_name]
+    ).fetchone()
+    return row[0] > 0
+
+def table_columns(con, table_name: str) -> dict:
+    """Return {column: type} for an existing table, in column order."""
+    return {row[0]: row[1] for row in con.execute(f"DESCRIBE {quote_identifier(table_name)}").fetchall()}
+
+def apply_column_types(con, table_name: str, column_types: dict):
+    """
+    Convert existing columns of `table_name` to the types in `column_types`.
+
+    Values that do not cast become NULL. Columns the table lacks are ignored.
+    """
+    table = quote_identifier(table_name)
+    for column, current in table_columns(con, table_name).items():
+        wanted = column_types.get(column)
+        if not wanted or current.replace(" ", "").upper() == wanted.replace(" ", "").upper():
+            continue
+        col = quote_identifier(column)
+        con.execute(f"ALTER TABLE {table} ALTER {col} TYPE {wanted} USING try_cast({col} AS {wanted})")
+
+
+class TableWriter:
+    """
+    Append dict rows to a DuckDB table batch by batch.
+
+    The table is created from the first batch and gains a column whenever a
+    new key shows up. Column types come from `column_types` when given,
+    otherwise from the first non-null value seen for that key.
+
+    Each batch passes through a short-lived NDJSON file in `spill_dir`
+    (by default next to the database file) that is deleted once loaded.
+    """
+
+    def __init__(self, con, table_name: str, column_types: dict = None, replace: bool = True,
+                 spill_dir=None):
+        self.con = con
+        self.table_name = table_name
+        self.column_types = column_types or {}
+        self.rows_written = 0
+        self.spill_dir = spill_dir or database_dir(con)
+
+        if replace:
+            con.execute(f"DROP TABLE IF EXISTS {quote_identifier(table_name)}")
+        self.columns = table_columns(con, table_name) if table_exists(con, table_name) else {}
+
+    def _add_columns(self, rows: list):
+        new_columns = {}
+        for row in rows:
+            for key, value in row.items():
+                if key in self.columns:
+                    continue
+                if key not in new_columns or (new_columns[key] is None and value is not None):
+                    new_columns[key] = None if value is None else infer_column_type(value)
+
+        if not new_columns:
+            return
+
+        for key, inferred in new_columns.items():
+            new_columns[key] = self.column_types.get(key) or inferred or "VARCHAR"
+
+        table = quote_identifier(self.table_name)
+        if not self.columns:
+            column_defs = ", ".join(f"{quote_identifier(k)} {t}" for k, t in new_columns.items())
+            self.con.execute(f"CREATE TABLE {table} ({column_defs})")
+        else:
+            for key, column_type in new_columns.items():
+                self.con.execute(f"ALTER TABLE {table} ADD COLUMN {quote_identifier(key)} {column_type}")
+        self.columns.update(new_columns)
+
+    def _convert(self, value, column_type: str):
+        if value is None:
+            return None
+        if isinstance(value, (dict, list)):
+            return value if column_type == "JSON" else json.dumps(value)
+        if column_type == "JSON" and isinstance(value, str):
+            # Already serialized JSON must not be encoded again as a string
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        if value == "" and column_type != "VARCHAR":
+            return None
+        return value
+
+    def write(self, rows: list):
+        """
+        Insert a batch of dict rows.
+
+        The batch is spilled to a newline-delimited JSON file and loaded with
+        read_json using the table's column types. Binding every value as a
+        statement parameter managed about 1k rows/s; this is about 60x faster.
+        The file only ever holds one batch, so memory and disk use stay bounded.
+        """
+        if not rows:
+            return
+
+        self._add_columns(rows)
+
+        fd, path = tempfile.mkstemp(prefix=f".{self.table_name}_", suffix=".json", dir=self.spill_dir)
+        try:
+            with os.fdopen(fd, "w") as f:
+                for row in rows:
+                    f.write(json.dumps({c: self._convert(v, self.columns[c]) for c, v in row.items()},
+                                       default=str))
+                    f.write("\n")
+            self.con.execute(
+                f"INSERT INTO {quote_identifier(self.table_name)} BY NAME "
+                f"SELECT * FROM read_json('{path}', format='newline_delimited', "
+                f"columns={columns_spec(self.columns)})"
+            )
+        finally:
+            os.unlink(path)
+
+        self.rows_written += len(rows)
+
+
+@contextmanager
+def transaction(con):
+    """
+    Run the enclosed statements in one transaction on `con`.
+
+    It is committed when the block finishes and rolled back if anything in
+    it raises, so a failed statement never leaves the cursor stuck in an
+    aborted transaction.
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        yield con
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+def replace_table(con, source: str, target: str):
+    """
+    Replace `target` with the fully loaded `source` table.
+
+    The drop and rename run in one transaction, so readers see either the
+    old table or the new one and never a missing or half-loaded table.
+    DuckDB locks the file against other processes while `con` has it
+    open, so long fetches stage into a separate database and only attach
+    the cache for the swap (see `attached`).
+    """
+    with transaction(con):
+        con.execute(f"DROP TABLE IF EXISTS {quote_identifier(target)}")
+        con.execute(f"ALTER TABLE {quote_identifier(source)} RENAME TO {quote_identifier(target)}")
+
+def merge_table(con, source: str, target: str, key: str = "id", order_by: str = None):
+    """
+    Upsert the rows of `source` into `target` by `key`, then drop `source`.
+
+    Columns only present in `source` are added to `target` first. When
+    `source` holds several rows for one key, the last by `order_by` wins.
+    Everything runs in one transaction, so a failure leaves both tables as
+    they were.
+    """
+    src, dst, key_col = quote_identifier(source), quote_identifier(target), quote_identifier(key)
+    order = f"ORDER BY {order_by} DESC" if order_by else ""
+
+    with transaction(con):
+        existing = table_columns(con, target)
+        for column, column_type in table_columns(con, source).items():
+            if column not in existing:
+                con.execute(f"ALTER TABLE {dst} ADD COLUMN {quote_identifier(column)} {column_type}")
+
+        con.execute(f"DELETE FROM {dst} WHERE {key_col} IN (SELECT {key_col} FROM {src})")
+        con.execute(f"""
+            INSERT INTO {dst} BY NAME
+            SELECT * FROM {src}
+            QUALIFY row_number() OVER (PARTITION BY {key_col} {order}) = 1
+        """)
+        con.execute(f"DROP TABLE {src}")
+
+@contextmanager
+def attached(con, path, alias: str):
+    """
+    Attach the database file at `path` to `con` as `alias` for the
+    enclosed block, yielding a cursor whose default database it is.
+
+    `con` keeps its own default database, so staged tables can be copied
+    across with `copy_table`.
+    """
+    con.execute(f"ATTACH '{path}' AS {quote_identifier(alias)}")
+    cursor = con.cursor()
+    try:
+        cursor.execute(f"USE {quote_identifier(alias)}")
+        yield cursor
+    finally:
+        cursor.close()
+        con.execute(f"DETACH {quote_identifier(alias)}")
+
+def copy_table(con, source_con, table_name: str) -> bool:
+    """
+    Copy `table_name` from the default database of `source_con` into that
+    of `con`, replacing it. Both must share a connection (see `attached`).
+
+    Returns False, dropping any copy left in `con`, when `source_con` has
+    no such table.
+    """
+    table = quote_identifier(table_name)
+    if not table_exists(source_con, table_name):
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+        return False
+    database = source_con.execute("SELECT current_database()").fetchone()[0]
+    con.execute(f"CREATE OR REPLACE TABLE {table} AS FROM {quote_identifier(database)}.main.{table}")
+    return True
+
+
+# ----------------------------------------
+# Incremental sync watermarks
+# ----------------------------------------
+
+def create_sync_state(con):
+    """Create the table holding per-table incremental sync watermarks."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            object_type VARCHAR PRIMARY KEY,
+            watermark VARCHAR,
+            synced_at TIMESTAMP
+        )
+    """)
+
+def get_watermark(con, object_type: str):
+    """
+    Read the high-water mark of an incrementally synced table.
+
+    Returns None when the table itself is gone, forcing a full sync.
+    """
+    if not table_exists(con, "sync_state") or not table_exists(con, object_type):
+        return None
+    row = con.execute(
+        "SELECT watermark FROM sync_state WHERE object_type = ?", [object_type]
+    ).fetchone()
+    return row[0] if row else None
+
+def set_watermark(con, object_type: str, watermark: str):
+    """Persist the high-water mark of an incrementally synced table."""
+    con.execute(
+        "INSERT OR REPLACE INTO sync_state VALUES (?, ?, now())",
+        [object_type, str(watermark)]
+    )
+
+
+# ----------------------------------------
+# Pagination checkpoints
+# ----------------------------------------
+
+def create_checkpoint_table(con):
+    """Create the table recording where each in-progress paginated sync stopped."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            stream VARCHAR PRIMARY KEY,
+            mode VARCHAR,
+            cursor JSON,
+            rows_fetched BIGINT,
+            updated_at TIMESTAMP
+        )
+    """)
+
+def load_checkpoint(con, stream: str, staging_table: str):
+    """
+    Return the saved checkpoint for `stream` as a dict, or None.
+
+    A checkpoint is only usable while the staging table holding the rows
+    fetched so far still exists.
+    """
+    if not table_exists(con, "sync_checkpoints") or not table_exists(con, staging_table):
+        return None
+    row = con.execute(
+        "SELECT mode, cursor, rows_fetched FROM sync_checkpoints WHERE stream = ?", [stream]
+    ).fetchone()
+    if not row:
+        return None
+    return {"mode": row[0], "cursor": json.loads(row[1]), "rows_fetched": row[2]}
+
+def save_checkpoint(con, stream: str, mode: str, cursor, rows_fetched: int):
+    """Record the cursor of the next page to fetch for `stream`."""
+    con.execute(
+        "INSERT OR REPLACE INTO sync_checkpoints VALUES (?, ?, ?, ?, now())",
+        [stream, mode, json.dumps(cursor), rows_fetched]
+    )
+
+def clear_checkpoint(con, stream: str, staging_table: str = None):
+    """Forget the checkpoint of a finished sync, dropping its `staging_table` if given."""
+    if staging_table:
+        con.execute(f"DROP TABLE IF EXISTS {quote_identifier(staging_table)}")
+    if table_exists(con, "sync_checkpoints"):
+        con.execute("DELETE FROM sync_checkpoints WHERE stream = ?", [stream])
+
+
+# ----------------------------------------
+# Schema cache
+# ----------------------------------------
+
+def create_schema_cache(con):
+    """Create the table remembering the resolved schema of each loaded table."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS schema_cache (
+            table_name VARCHAR PRIMARY KEY,
+            columns JSON,
+            updated_at TIMESTAMP
+        )
+    """)
+
+def cached_schema(con, table_name: str) -> dict:
+    """Return the recorded {column: type} of `table_name`, or {} if unknown."""
+    if not table_exists(con, "schema_cache"):
+        return {}
+    row = con.execute(
+        "SELECT columns FROM schema_cache WHERE table_name = ?", [table_name]
+    ).fetchone()
+    return json.loads(row[0]) if row else {}
+
+def base_type(column_type: str) -> str:
+    """A column type without its ENUM value list."""
+    return "ENUM" if column_type.startswith("ENUM(") else column_type
+
+def schema_drift(old: dict, new: dict) -> list:
+    """
+    Describe how schema `new` differs from `old`, one line per column.
+
+    An ENUM gaining values is not drift, so ENUM types compare as just "ENUM".
+    """
+    old = {c: base_type(t) for c, t in old.items()}
+    new = {c: base_type(t) for c, t in new.items()}
+    changes = [f"added {c} {t}" for c, t in new.items() if c not in old]
+    changes += [f"removed {c}" for c in old if c not in new]
+    changes += [f"{c} changed from {old[c]} to {t}" for c, t in new.items() if c in old and old[c] != t]
+    return changes
+
+def record_schema(con, table_name: str) -> list:
+    """
+    Remember the current schema of `table_name` for the next load.
+
+    Differences from the previously recorded schema are printed and
+    returned.
+    """
+    if not table_exists(con, "schema_cache"):
+        create_schema_cache(con)
+    old = cached_schema(con, table_name)
+    new = table_columns(con, table_name)
+    changes = schema_drift(old, new) if old else []
+    for change in changes:
+        print(f"  Schema drift in {table_name}: {change}")
+    if new != old:
+        con.execute(
+            "INSERT OR REPLACE INTO schema_cache VALUES (?, ?, now())",
+            [table_name, json.dumps(new)]
+        )
+    return changes
+
+def columns_spec(schema: dict) -> str:
+    """Render {column: type} as the `columns` argument of read_csv / read_json."""
+    def literal(value):
+        return "'" + str(value).replace("'", "''") + "'"
+    return "{" + ", ".join(f"{literal(c)}: {literal(t)}" for c, t in schema.items()) + "}"
+
+def load_first_fitting(con, table_name: str, statement: str, sources: list) -> int:
+    """
+    Run `statement` with its `{source}` placeholder set to each of `sources`
+    in turn until one succeeds, returning the row count it reports.
+
+    `sources` read the same data, the one typed from the cached schema of
+    `table_name` first; when the data no longer fits those types the next
+    source, which infers them again, is tried. The last error is raised.
+    """
+    for source in sources:
+        try:
+            return con.execute(statement.format(source=source)).fetchone()[0]
+        except duckdb.Error as e:
+            if source == sources[-1]:
+                raise
+            print(f"  Cached schema of {table_name} no longer fits ({str(e).splitlines()[0]}), inferring it again")
+
+
+# ----------------------------------------
+# Enum columns
+# ----------------------------------------
+
+def widen_enum_columns(con, table_name: str, source: str) -> list:
+    """
+    Turn ENUM columns of `table_name` back into VARCHAR where the table
+    `source` holds values the ENUM lacks, so its rows can be inserted.
+
+    Returns the widened columns; `encode_enum_columns` re-encodes them.
+    """
+    source_columns = table_columns(con, source)
+    table, src = quote_identifier(table_name), quote_identifier(source)
+    widened = []
+    for column, column_type in table_columns(con, table_name).items():
+        if not column_type.startswith("ENUM(") or column not in source_columns:
+            continue
+        col = quote_identifier(column)
+        unknown = con.execute(f"""
+            SELECT count(*) FROM (SELECT DISTINCT CAST({col} AS VARCHAR) AS value FROM {src})
+            WHERE value IS NOT NULL AND value NOT IN (SELECT unnest(enum_range(NULL::{column_type})))
+        """).fetchone()[0]
+        if unknown:
+            con.execute(f"ALTER TABLE {table} ALTER {col} TYPE VARCHAR")
+            widened.append(column)
+    return widened
+
+def encode_enum_columns(con, table_name: str, columns: list, known_values: dict = None,
+                        max_values: int = 1000) -> list:
+    """
+    Store the VARCHAR `columns` of `table_name` as ENUMs.
+
+    Each ENUM holds the column's distinct values plus any `known_values`
+    for it (e.g. every stage of a pipeline), so values that show up later
+    rarely force a re-encode. Columns with more than `max_values` distinct
+    values stay VARCHAR. Returns the encoded columns.
+    """
+    known_values = known_values or {}
+    table = quote_identifier(table_name)
+    current = table_columns(con, table_name)
+    encoded = []
+    for column in columns:
+        if current.get(column) != "VARCHAR":
+            continue
+        col = quote_identifier(column)
+        values = {row[0] for row in con.execute(
+            f"SELECT DISTINCT {col} FROM {table} WHERE {col} IS NOT NULL"
+        ).fetchall()}
+        values.update(str(v) for v in known_values.get(column, ()) if v is not None)
+        if not values or len(values) > max_values:
+            continue
+        enum_type = "ENUM(" + ", ".join("'" + v.replace("'", "''") + "'" for v in sorted(values)) + ")"
+        # Every live value is in the ENUM; try_cast only keeps the conversion
+        # from tripping over values of deleted rows it still scans
+        con.execute(f"ALTER TABLE {table} ALTER {col} TYPE {enum_type} USING try_cast({col} AS {enum_type})")
+        encoded.append(column)
+    return encoded
+
+
+# ----------------------------------------
+# Parquet snapshots
+# ----------------------------------------
+
+def snapshots_enabled() -> bool:
+    """Whether loaders should also write Parquet snapshots (SYNC_SNAPSHOTS=1)."""
+    return os.environ.get('SYNC_SNAPSHOTS', '').lower() in ('1', 'true', 'yes')
+
+def write_snapshot(con, table_name: str, data_dir, sync_date: date = None):
+    """
+    Write `table_name` as a zstd-compressed Parquet snapshot.
+
+    Snapshots live in data_dir/snapshots/<table>/sync_date=<date>/; a later
+    sync on the same day replaces that day's file. Views over them are kept
+    in data_dir/snapshots.duckdb (see `create_snapshot_views`).
+    """
+    sync_date = sync_date or date.today()
+    directory = data_dir / 'snapshots' / table_name / f"sync_date={sync_date.isoformat()}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{table_name}.parquet"
+
+    # Written aside and renamed, so readers never open a half-written file
+    partial = directory / f".{table_name}.parquet.tmp"
+    con.execute(
+        f"COPY {quote_identifier(table_name)} TO '{partial}' (FORMAT parquet, COMPRESSION zstd)"
+    )
+    os.replace(partial, path)
+    print(f"  Snapshot of {table_name} written to {path}")
+
+    create_snapshot_views(data_dir, table_name)
+    return path
+
+def create_snapshot_views(data_dir, table_name: str, attempts: int = 10):
+    """
+    Define the snapshot views of `table_name` in data_dir/snapshots.duckdb:
+    `<table>_history` over every snapshot, with its sync_date, and `<table>`
+    over the latest one.
+
+    The views glob the snapshot directory, so they are only created when
+    missing. The glob is relative to the data directory, so the data
+    directory can move; readers open the file with it as the working
+    directory or set `file_search_path` to it. Another process may be
+    holding the file, so a failed attempt is retried for a while and then
+    reported without failing the sync.
+    """
+    pattern = f"snapshots/{table_name}/*/*.parquet"
+    history = quote_identifier(f"{table_name}_history")
+    for attempt in range(attempts):
+        try:
+            con = duckdb.connect(str(data_dir / 'snapshots.duckdb'))
+            break
+        except duckdb.IOException as e:
+            if attempt == attempts - 1:
+                print(f"  Could not update snapshot views of {table_name}: {str(e).splitlines()[0]}")
+                return
+            time.sleep(0.2 * (attempt + 1))
+
+    try:
+        existing = {row[0] for row in con.execute(
+            "SELECT view_name FROM duckdb_views() WHERE NOT internal"
+        ).fetchall()}
+        if {f"{table_name}_history", table_name} <= existing:
+            return
+        con.execute(f"SET file_search_path = '{data_dir.resolve()}'")
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {history} AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)
+        """)
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {quote_identifier(table_name)} AS
+            SELECT * EXCLUDE (sync_date) FROM {history}
+            WHERE sync_date = (SELECT max(sync_date) FROM {history})
+        """)
+    finally:
+        con.close()
@@ -0,0 +1,209 @@
+"""
+HTTP helpers shared by the API sync scripts.
+
+All requests go through pooled keep-alive sessions so paginated syncs reuse
+connections instead of paying a TCP + TLS handshake per page, and through a
+bounded retry loop so throttling and transient server errors are waited out
+instead of aborting the sync.
+"""
+
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from sync_metrics import record_request, record_wait
+
+# Number of hosts to keep connection pools for, and connections per host
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", 10))
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Responses a non-idempotent request may be retried on: the server rejected
+# it before doing anything
+UNPROCESSED_STATUS_CODES = frozenset({429})
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def create_session(headers: dict = None, pool_size: int = POOL_SIZE,
+                   max_per_host: int = MAX_CONNECTIONS_PER_HOST) -> requests.Session:
+    """
+    Create a keep-alive session with a bounded connection pool.
+
+    At most `max_per_host` connections are opened to any one host; extra
+    concurrent requests wait for a free connection instead of opening more.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=max_per_host,
+        pool_block=True
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive"
+    })
+    if headers:
+        session.headers.update(headers)
+    return session
+
+def get_shared_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
+
+class RetryPolicy:
+    """
+    How often and how long to retry a failed request.
+
+    Delays grow exponentially from `base_delay` up to `max_delay` with full
+    jitter. A `Retry-After` header on the response takes precedence.
+    """
+
+    def __init__(self, max_attempts: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 timeout: float = 60.0, retry_statuses=RETRY_STATUS_CODES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered delay before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryStats:
+    """Thread-safe counters of requests made, retries and time spent waiting."""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+        self.retries_by_reason = {}
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self, reason: str, delay: float):
+        with self._lock:
+            self.retries += 1
+            self.wait_seconds += delay
+            self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "wait_seconds": round(self.wait_seconds, 2),
+                "retries_by_reason": dict(self.retries_by_reason)
+            }
+
+    def summary(self) -> str:
+        stats = self.as_dict()
+        reasons = ", ".join(f"{k}: {v}" for k, v in sorted(stats["retries_by_reason"].items()))
+        return (f"{stats['requests']} requests, {stats['retries']} retries"
+                f"{f' ({reasons})' if reasons else ''}, {stats['wait_seconds']}s waiting")
+
+
+def parse_retry_after(value: str):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def failed_to_connect(error: requests.RequestException) -> bool:
+    """Whether `error` happened before the request reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def request_with_retry(session: requests.Session, method: str, url: str,
+                       policy: RetryPolicy = None, stats: RetryStats = None,
+                       before_attempt=None, idempotent: bool = True, **kwargs) -> requests.Response:
+    """
+    Send a request, retrying throttling, 5xx responses and connection errors.
+
+    `before_attempt` is called before every attempt, e.g. to take a token
+    from a rate limiter. Pass `idempotent=False` for requests that must not
+    run twice (e.g. creating objects): those are only retried when the
+    server cannot have acted on them, i.e. on 429 and on failures to
+    connect, since a timeout or 5xx may come after the write happened.
+    Raises once `policy.max_attempts` is exhausted or on any other non-2xx
+    response.
+    """
+    policy = policy or RetryPolicy()
+    retry_statuses = policy.retry_statuses if idempotent else policy.retry_statuses & UNPROCESSED_STATUS_CODES
+    kwargs.setdefault("timeout", policy.timeout)
+    host = urlparse(url).netloc
+
+    for attempt in range(1, policy.max_attempts + 1):
+        if before_attempt:
+            before_attempt()
+        if stats:
+            stats.record_request()
+
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            record_request(time.perf_counter() - started, ok=False)
+            if attempt == policy.max_attempts or not (idempotent or failed_to_connect(e)):
+                if stats:
+                    stats.record_failure()
+                raise
+            reason = type(e).__name__
+            delay = policy.backoff(attempt)
+        else:
+            record_request(time.perf_counter() - started, len(response.content), response.ok)
+            if response.status_code not in retry_statuses or attempt == policy.max_attempts:
+                if not response.ok and stats:
+                    stats.record_failure()
+                response.raise_for_status()
+                return response
+            reason = str(response.status_code)
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = retry_after if retry_after is not None else policy.backoff(attempt)
+
+        if stats:
+            stats.record_retry(reason, delay)
+        print(f"  {reason} from {host}, retrying in {delay:.1f}s "
+              f"(attempt {attempt}/{policy.max_attempts})")
+        record_wait("retry", delay)
+        time.sleep(delay)
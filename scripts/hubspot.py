@@ -13,14 +13,30 @@ Usage:
     # Sync specific objects
     python scripts/hubspot.py sync --objects contacts,deals
     
+    # Force a full re-download instead of an incremental sync
+    python scripts/hubspot.py sync --full
+    
+    # Also write dated Parquet snapshots (data/snapshots/, views in data/snapshots.duckdb)
+    python scripts/hubspot.py sync --snapshot
+    
     # Run a specific action
     python scripts/hubspot.py action update_deal_stages
     
+    # List the lifecycle stage updates, then write them to HubSpot
+    python scripts/hubspot.py action lifecycle_update
+    python scripts/hubspot.py action lifecycle_update --apply
+    
     # Run daily automation
-    python scripts/hubspot.py daily
+    python scripts/hubspot.py daily [--apply]
+
+Each sync run's timings and request counts are appended to
+data/sync_runs.jsonl and to the sync_runs table of the cache.
     
 Environment Variables:
     HUBSPOT_ACCESS_TOKEN (required)
+    HUBSPOT_BASE_URL (optional, default: 'https://api.hubapi.com')
+    SYNC_SNAPSHOTS (optional, write Parquet snapshots on every sync)
+    HUBSPOT_APPLY_LIFECYCLE_UPDATES (optional, same as --apply)
 """
 
 import os
@@ -28,51 +44,196 @@ import sys
 import json
 import time
 import argparse
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional
 import requests
 import duckdb
 
+from http_utils import RetryPolicy, RetryStats, create_session, request_with_retry
+from sync_metrics import finish, record_wait, stage, start_run, timed
+from duckdb_utils import (
+    TableWriter, apply_column_types, attached, cached_schema, clear_checkpoint, copy_table,
+    create_checkpoint_table, create_schema_cache, create_sync_state, encode_enum_columns,
+    get_watermark, load_checkpoint, merge_table, quote_identifier, record_schema, replace_table, save_checkpoint, set_watermark,
+    snapshots_enabled, table_columns, table_exists, transaction, widen_enum_columns, write_snapshot
+)
+
 # Configuration
 DATA_DIR = Path(__file__).parent.parent / 'data'
 DUCKDB_PATH = DATA_DIR / 'hubspot_cache.duckdb'
+# Fetched pages are staged here, so the cache is only locked while they are swapped in
+STAGING_PATH = DATA_DIR / 'hubspot_staging.duckdb'
 ACTIONS_LOG = DATA_DIR / 'hubspot_actions.log'
 
-BASE_URL = "https://api.hubapi.com"
+BASE_URL = os.environ.get("HUBSPOT_BASE_URL", "https://api.hubapi.com")
+
+# Default properties fetched per CRM object
+DEFAULT_PROPERTIES = {
+    "contacts": ["email", "firstname", "lastname", "phone",
+                 "company", "lifecyclestage", "hs_lead_status",
+                 "createdate", "lastmodifieddate"],
+    "companies": ["name", "domain", "industry", "numberofemployees",
+                  "annualrevenue", "city", "state", "country",
+                  "createdate", "lastmodifieddate", "hs_lastmodifieddate"],
+    "deals": ["dealname", "amount", "dealstage", "pipeline",
+              "closedate", "createdate", "hs_lastmodifieddate",
+              "hubspot_owner_id"],
+}
+
+# Property used as the incremental sync watermark per CRM object
+MODIFIED_PROPERTY = {
+    "contacts": "lastmodifieddate",
+    "companies": "hs_lastmodifieddate",
+    "deals": "hs_lastmodifieddate",
+}
+
+# Incremental searches start this long before the stored watermark, and a
+# full sync stores the time its listing started minus this much: the search
+# index trails writes, and a listing ordered by id misses edits made to
+# records it has already passed. The merge drops the re-fetched duplicates.
+SYNC_OVERLAP = timedelta(minutes=10)
+
+# Column types for HubSpot fields; other properties are stored as VARCHAR
+COLUMN_TYPES = {
+    "amount": "DECIMAL(18, 2)",
+    "created_at": "TIMESTAMP",
+    "updated_at": "TIMESTAMP",
+    "createdate": "TIMESTAMP",
+    "closedate": "TIMESTAMP",
+    "lastmodifieddate": "TIMESTAMP",
+    "hs_lastmodifieddate": "TIMESTAMP",
+    "synced_at": "TIMESTAMP",
+}
+
+# Low-cardinality properties stored as ENUMs once a sync has finished, so
+# dashboards group and filter on small integer codes. A column with more
+# than MAX_ENUM_VALUES distinct values stays VARCHAR.
+ENUM_COLUMNS = {
+    "contacts": ["lifecyclestage", "hs_lead_status"],
+    "companies": ["industry", "country"],
+    "deals": ["dealstage", "pipeline", "hubspot_owner_id"],
+}
+MAX_ENUM_VALUES = 1000
+
+# Maximum number of inputs accepted by the CRM batch endpoints, and by
+# batch reads that include property history
+BATCH_SIZE = 100
+HISTORY_BATCH_SIZE = 50
+
+# The CRM search API refuses to page past this many results per query
+SEARCH_RESULT_LIMIT = 10000
+
+# Rate limits shared by all concurrent requests of one client. Defaults match
+# a private app on a Starter portal (100 requests / 10s, 250k / day); the
+# search endpoints have their own, lower per-second limit.
+RATE_LIMIT_PER_SECOND = float(os.environ.get("HUBSPOT_RATE_LIMIT_PER_SECOND", 10))
+RATE_LIMIT_PER_DAY = int(os.environ.get("HUBSPOT_RATE_LIMIT_PER_DAY", 250000))
+SEARCH_RATE_LIMIT_PER_SECOND = 4
+
+# Number of object types fetched in parallel by sync_data
+DEFAULT_SYNC_WORKERS = 5
+
+# Also write Parquet snapshots of the synced tables (SYNC_SNAPSHOTS=1 or --snapshot)
+SNAPSHOTS = snapshots_enabled()
+
+# The lifecycle update only writes to HubSpot when asked to (--apply)
+APPLY_LIFECYCLE_UPDATES = os.environ.get("HUBSPOT_APPLY_LIFECYCLE_UPDATES", "").lower() in ("1", "true", "yes")
 
 # ============================================
 # API Client
 # ============================================
 
+class RateLimiter:
+    """
+    Thread-safe token bucket.
+    
+    Allows bursts of up to `per_second` requests and refills at that rate;
+    once `per_day` requests have been made in the current UTC day, further
+    requests raise instead of waiting for the quota to reset.
+    """
+    
+    def __init__(self, per_second: float, per_day: int = None):
+        self.rate = per_second
+        self.capacity = max(1.0, per_second)
+        self.tokens = self.capacity
+        self.per_day = per_day
+        self.day = datetime.utcnow().date()
+        self.day_count = 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be made, then consume one token."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                today = datetime.utcnow().date()
+                if today != self.day:
+                    self.day, self.day_count = today, 0
+                if self.per_day and self.day_count >= self.per_day:
+                    raise RuntimeError(f"Daily API limit of {self.per_day} requests reached")
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.day_count += 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            
+            record_wait("rate limit", wait)
+            time.sleep(wait)
+
+
 class HubSpotClient:
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, limiter: RateLimiter = None,
+                 search_limiter: RateLimiter = None, session: requests.Session = None,
+                 retry_policy: RetryPolicy = None):
         self.access_token = access_token
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
-    
-    def _request(self, method: str, endpoint: str, **kwargs) -> dict:
-        """Make authenticated request to HubSpot API."""
+        self.session = session or create_session(self.headers)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = RetryStats()
+        self.limiter = limiter or RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_PER_DAY)
+        self.search_limiter = search_limiter or RateLimiter(SEARCH_RATE_LIMIT_PER_SECOND)
+    
+    def _request(self, method: str, endpoint: str, idempotent: bool = True, **kwargs) -> dict:
+        """
+        Make authenticated request to HubSpot API.
+        
+        Requests creating objects pass `idempotent=False`, so a timeout or 5xx
+        does not resend a write HubSpot may already have applied.
+        """
         url = f"{BASE_URL}{endpoint}"
-        response = requests.request(method, url, headers=self.headers, **kwargs)
         
-        # Handle rate limiting
-        if response.status_code == 429:
-            retry_after = int(response.headers.get('Retry-After', 10))
-            print(f"Rate limited. Waiting {retry_after}s...")
-            time.sleep(retry_after)
-            return self._request(method, endpoint, **kwargs)
+        def take_token():
+            if endpoint.endswith("/search"):
+                self.search_limiter.acquire()
+            self.limiter.acquire()
         
-        response.raise_for_status()
+        response = request_with_retry(
+            self.session, method, url,
+            policy=self.retry_policy,
+            stats=self.retry_stats,
+            before_attempt=take_token,
+            idempotent=idempotent,
+            headers=self.headers,
+            **kwargs
+        )
         return response.json() if response.text else {}
     
     def get(self, endpoint: str, params: dict = None) -> dict:
         return self._request("GET", endpoint, params=params)
     
-    def post(self, endpoint: str, data: dict = None) -> dict:
-        return self._request("POST", endpoint, json=data)
+    def post(self, endpoint: str, data: dict = None, idempotent: bool = True) -> dict:
+        return self._request("POST", endpoint, idempotent=idempotent, json=data)
     
     def patch(self, endpoint: str, data: dict = None) -> dict:
         return self._request("PATCH", endpoint, json=data)
@@ -81,14 +242,15 @@ class HubSpotClient:
     # Read Operations
     # ----------------------------------------
     
-    def get_all_contacts(self, properties: list = None, limit: int = 100) -> list:
-        """Fetch all contacts with pagination."""
-        properties = properties or ["email", "firstname", "lastname", "phone", 
-                                    "company", "lifecyclestage", "hs_lead_status",
-                                    "createdate", "lastmodifieddate"]
+    def iter_pages(self, object_type: str, properties: list = None, limit: int = 100,
+                   after: str = None):
+        """
+        Yield every page of a CRM object type as `(objects, next_after)`.
         
-        all_contacts = []
-        after = None
+        `next_after` is the cursor of the following page (None after the last
+        page); passing it back as `after` resumes the listing from there.
+        """
+        properties = properties or DEFAULT_PROPERTIES[object_type]
         
         while True:
             params = {
@@ -98,78 +260,80 @@ class HubSpotClient:
             if after:
                 params["after"] = after
             
-            result = self.get("/crm/v3/objects/contacts", params)
-            all_contacts.extend(result.get("results", []))
+            result = self.get(f"/crm/v3/objects/{object_type}", params)
             
             paging = result.get("paging", {})
             after = paging.get("next", {}).get("after")
             
+            yield result.get("results", []), after
+            
             if not after:
                 break
-            
-            print(f"  Fetched {len(all_contacts)} contacts...")
-        
-        return all_contacts
+    
+    def get_all_contacts(self, properties: list = None, limit: int = 100) -> list:
+        """Fetch all contacts with pagination."""
+        return [c for page, _ in self.iter_pages("contacts", properties, limit) for c in page]
     
     def get_all_companies(self, properties: list = None, limit: int = 100) -> list:
         """Fetch all companies with pagination."""
-        properties = properties or ["name", "domain", "industry", "numberofemployees",
-                                    "annualrevenue", "city", "state", "country",
-                                    "createdate", "lastmodifieddate"]
-        
-        all_companies = []
-        after = None
-        
-        while True:
-            params = {
-                "limit": limit,
-                "properties": ",".join(properties)
-            }
-            if after:
-                params["after"] = after
-            
-            result = self.get("/crm/v3/objects/companies", params)
-            all_companies.extend(result.get("results", []))
-            
-            paging = result.get("paging", {})
-            after = paging.get("next", {}).get("after")
-            
-            if not after:
-                break
-            
-            print(f"  Fetched {len(all_companies)} companies...")
-        
-        return all_companies
+        return [c for page, _ in self.iter_pages("companies", properties, limit) for c in page]
     
     def get_all_deals(self, properties: list = None, limit: int = 100) -> list:
         """Fetch all deals with pagination."""
-        properties = properties or ["dealname", "amount", "dealstage", "pipeline",
-                                    "closedate", "createdate", "hs_lastmodifieddate",
-                                    "hubspot_owner_id"]
+        return [d for page, _ in self.iter_pages("deals", properties, limit) for d in page]
+    
+    def iter_modified_since(self, object_type: str, since: str,
+                            properties: list = None, limit: int = 100, after: str = None):
+        """
+        Yield pages of objects modified at or after `since` (ISO timestamp)
+        via the CRM search API, oldest first, as `(objects, next_cursor)`.
+        
+        `next_cursor` is a `{"since", "after"}` dict locating the following
+        page (None after the last page) that can be passed back to resume.
         
-        all_deals = []
-        after = None
+        The search API stops paging at 10,000 results, so when a query gets
+        close to that ceiling it is restarted from the last modified date seen.
+        Objects on that boundary can be yielded twice.
+        """
+        properties = properties or DEFAULT_PROPERTIES[object_type]
+        modified_prop = MODIFIED_PROPERTY[object_type]
+        
+        last_modified = None
         
         while True:
-            params = {
-                "limit": limit,
-                "properties": ",".join(properties)
+            data = {
+                "filterGroups": [{"filters": [{
+                    "propertyName": modified_prop,
+                    "operator": "GTE",
+                    "value": str(to_epoch_ms(since))
+                }]}],
+                "sorts": [{"propertyName": modified_prop, "direction": "ASCENDING"}],
+                "properties": properties,
+                "limit": limit
             }
             if after:
-                params["after"] = after
+                data["after"] = after
             
-            result = self.get("/crm/v3/objects/deals", params)
-            all_deals.extend(result.get("results", []))
+            result = self.post(f"/crm/v3/objects/{object_type}/search", data)
+            page = result.get("results", [])
+            last_modified = max_modified(page, object_type) or last_modified
             
-            paging = result.get("paging", {})
-            after = paging.get("next", {}).get("after")
+            after = result.get("paging", {}).get("next", {}).get("after")
+            if after and int(after) + limit > SEARCH_RESULT_LIMIT:
+                # Restart the query from the newest modified date seen so far
+                if not last_modified or last_modified == since:
+                    print(f"  Warning: more than {SEARCH_RESULT_LIMIT} {object_type} "
+                          f"share modified date {since}; some may be skipped")
+                    after = None
+                else:
+                    since, after = last_modified, None
+                    yield page, {"since": since, "after": None}
+                    continue
+            
+            yield page, ({"since": since, "after": after} if after else None)
             
             if not after:
                 break
-            
-            print(f"  Fetched {len(all_deals)} deals...")
-        
-        return all_deals
     
     def get_pipelines(self) -> list:
         """Fetch all deal pipelines and stages."""
@@ -187,7 +351,7 @@ class HubSpotClient:
     
     def create_contact(self, properties: dict) -> dict:
         """Create a new contact."""
-        return self.post("/crm/v3/objects/contacts", {"properties": properties})
+        return self.post("/crm/v3/objects/contacts", {"properties": properties}, idempotent=False)
     
     def update_contact(self, contact_id: str, properties: dict) -> dict:
         """Update an existing contact."""
@@ -195,7 +359,7 @@ class HubSpotClient:
     
     def create_deal(self, properties: dict) -> dict:
         """Create a new deal."""
-        return self.post("/crm/v3/objects/deals", {"properties": properties})
+        return self.post("/crm/v3/objects/deals", {"properties": properties}, idempotent=False)
     
     def update_deal(self, deal_id: str, properties: dict) -> dict:
         """Update an existing deal."""
@@ -211,27 +375,101 @@ class HubSpotClient:
         }
         if associations:
             data["associations"] = associations
-        return self.post("/crm/v3/objects/notes", data)
+        return self.post("/crm/v3/objects/notes", data, idempotent=False)
     
     def create_task(self, subject: str, body: str = "", due_date: str = None, 
                     owner_id: str = None, associations: list = None) -> dict:
         """Create a task."""
-        properties = {
-            "hs_task_subject": subject,
-            "hs_task_body": body,
-            "hs_task_status": "NOT_STARTED",
-            "hs_task_priority": "MEDIUM"
-        }
-        if due_date:
-            properties["hs_timestamp"] = due_date
-        if owner_id:
-            properties["hubspot_owner_id"] = owner_id
+        return self.post("/crm/v3/objects/tasks",
+                         build_task(subject, body, due_date, owner_id, associations),
+                         idempotent=False)
+    
+    # ----------------------------------------
+    # Batch Write Operations
+    # ----------------------------------------
+    
+    def _batch(self, endpoint: str, inputs: list, chunk_size: int = BATCH_SIZE,
+               idempotent: bool = True, on_chunk=None, **body) -> list:
+        """
+        POST `inputs` to a batch endpoint in chunks, returning all results.
         
-        data = {"properties": properties}
-        if associations:
-            data["associations"] = associations
+        Create endpoints pass `idempotent=False` so a chunk is only resent
+        when HubSpot cannot have processed it (see `request_with_retry`).
+        `on_chunk(chunk, results)` is called after each chunk succeeds, so
+        callers can record what was written before a later chunk fails.
+        """
+        results = []
+        
+        for start in range(0, len(inputs), chunk_size):
+            chunk = inputs[start:start + chunk_size]
+            result = self.post(endpoint, {"inputs": chunk, **body}, idempotent=idempotent)
+            results.extend(result.get("results", []))
+            
+            for error in result.get("errors", []):
+                print(f"  Batch error ({error.get('category', 'ERROR')}): {error.get('message')}")
+            
+            if on_chunk:
+                on_chunk(chunk, result.get("results", []))
         
-        return self.post("/crm/v3/objects/tasks", data)
+        return results
+    
+    def batch_create(self, object_type: str, inputs: list, on_chunk=None) -> list:
+        """Create objects from `{"properties": ..., "associations": ...}` inputs."""
+        return self._batch(f"/crm/v3/objects/{object_type}/batch/create", inputs,
+                           idempotent=False, on_chunk=on_chunk)
+    
+    def batch_update(self, object_type: str, inputs: list) -> list:
+        """Update objects from `{"id": ..., "properties": ...}` inputs."""
+        return self._batch(f"/crm/v3/objects/{object_type}/batch/update", inputs)
+    
+    def batch_read(self, object_type: str, ids: list, properties: list = None,
+                   properties_with_history: list = None) -> list:
+        """Read objects by id, optionally with the change history of some properties."""
+        body = {"properties": properties or []}
+        chunk_size = BATCH_SIZE
+        if properties_with_history:
+            body["propertiesWithHistory"] = properties_with_history
+            chunk_size = HISTORY_BATCH_SIZE
+        return self._batch(f"/crm/v3/objects/{object_type}/batch/read",
+                           [{"id": object_id} for object_id in ids], chunk_size, **body)
+    
+    def batch_associate(self, from_type: str, to_type: str, pairs: list,
+                        association_type_id: int, category: str = "HUBSPOT_DEFINED") -> list:
+        """Associate `(from_id, to_id)` pairs with one association type."""
+        inputs = [{
+            "from": {"id": from_id},
+            "to": {"id": to_id},
+            "types": [{"associationCategory": category, "associationTypeId": association_type_id}]
+        } for from_id, to_id in pairs]
+        return self._batch(f"/crm/v4/associations/{from_type}/{to_type}/batch/create", inputs,
+                           idempotent=False)
+    
+    def batch_read_associations(self, from_type: str, to_type: str, ids: list) -> dict:
+        """Return `{from_id: [to_id, ...]}` for the given object ids."""
+        results = self._batch(f"/crm/v4/associations/{from_type}/{to_type}/batch/read",
+                              [{"id": object_id} for object_id in ids])
+        return {
+            str(r["from"]["id"]): [str(to["toObjectId"]) for to in r.get("to", [])]
+            for r in results
+        }
+    
+    def create_tasks(self, tasks: list, on_chunk=None) -> list:
+        """Create many tasks (as built by `build_task`) in batches."""
+        return self.batch_create("tasks", tasks, on_chunk=on_chunk)
+    
+    def update_contacts(self, updates: dict) -> list:
+        """Update many contacts from a `{contact_id: properties}` mapping."""
+        return self.batch_update("contacts", [
+            {"id": contact_id, "properties": properties}
+            for contact_id, properties in updates.items()
+        ])
+    
+    def update_deals(self, updates: dict) -> list:
+        """Update many deals from a `{deal_id: properties}` mapping."""
+        return self.batch_update("deals", [
+            {"id": deal_id, "properties": properties}
+            for deal_id, properties in updates.items()
+        ])
     
     def search_contacts(self, filters: list, properties: list = None, limit: int = 100) -> list:
         """Search contacts with filters."""
@@ -260,10 +498,52 @@ class HubSpotClient:
         return result.get("results", [])
 
 
+def build_task(subject: str, body: str = "", due_date: str = None,
+               owner_id: str = None, associations: list = None) -> dict:
+    """Build the request body of a task for single or batch creation."""
+    properties = {
+        "hs_task_subject": subject,
+        "hs_task_body": body,
+        "hs_task_status": "NOT_STARTED",
+        "hs_task_priority": "MEDIUM"
+    }
+    if due_date:
+        properties["hs_timestamp"] = due_date
+    if owner_id:
+        properties["hubspot_owner_id"] = owner_id
+    
+    data = {"properties": properties}
+    if associations:
+        data["associations"] = associations
+    return data
+
+
 # ============================================
 # Data Sync
 # ============================================
 
+def to_epoch_ms(timestamp: str) -> int:
+    """Convert a HubSpot ISO timestamp to epoch milliseconds."""
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def shift_timestamp(timestamp: str, delta: timedelta) -> str:
+    """Move a HubSpot ISO timestamp by `delta`, keeping the ISO format."""
+    shifted = datetime.fromtimestamp(to_epoch_ms(timestamp) / 1000, timezone.utc) + delta
+    return shifted.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def max_modified(objects, object_type: str) -> Optional[str]:
+    """Return the latest last-modified timestamp among HubSpot objects."""
+    modified_prop = MODIFIED_PROPERTY[object_type]
+    latest = None
+    for obj in objects:
+        value = obj.get("properties", {}).get(modified_prop) or obj.get("updatedAt")
+        if value and (latest is None or to_epoch_ms(value) > to_epoch_ms(latest)):
+            latest = value
+    return latest
+
 def flatten_hubspot_object(obj: dict) -> dict:
     """Flatten HubSpot object for DuckDB storage."""
     flat = {
@@ -275,105 +555,407 @@ def flatten_hubspot_object(obj: dict) -> dict:
     flat.update(obj.get("properties", {}))
     return flat
 
-def save_to_duckdb(data: list, table_name: str):
-    """Save data to DuckDB table."""
-    if not data:
-        print(f"  No data to save for {table_name}")
-        return
-    
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+def fetch_object(con, client: HubSpotClient, object_type: str, watermark: Optional[str] = None,
+                 schema: dict = None) -> tuple:
+    """
+    Stream one CRM object type page by page into the `<object>__staging`
+    table of the staging database `con`.
     
-    # Flatten objects
-    flat_data = [flatten_hubspot_object(obj) for obj in data]
+    With a watermark only objects modified since then (less SYNC_OVERLAP)
+    are fetched, and the new watermark is the newest modification seen.
+    Otherwise every object is fetched and the new watermark is the time the
+    listing started, less SYNC_OVERLAP, since the listing can miss edits
+    made while it runs. `schema` is the cached schema of the object's table.
     
-    # Save to JSON first
-    json_path = DATA_DIR / f'{table_name}.json'
-    with open(json_path, 'w') as f:
-        json.dump(flat_data, f)
+    Each page is committed to the staging table together with the cursor of
+    the next page, so an interrupted sync resumes from the last committed
+    page on the next run instead of starting over.
     
-    # Load into DuckDB
-    con = duckdb.connect(str(DUCKDB_PATH))
-    con.execute(f"DROP TABLE IF EXISTS {table_name}")
-    con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_json_auto('{json_path}')")
+    Returns (mode, new watermark, rows fetched) for `save_object`.
+    """
+    staging = f"{object_type}__staging"
+    checkpoint = load_checkpoint(con, object_type, staging)
+    # Columns keep the type they resolved to last time, even when a page
+    # holds only nulls for them. ENUMs are applied after the merge, so
+    # staging keeps plain VARCHAR and accepts values the ENUM lacks.
+    column_types = {column: column_type for column, column_type in (schema or {}).items()
+                    if not column_type.startswith("ENUM(")}
+    column_types.update(COLUMN_TYPES)
+    
+    if checkpoint and (watermark or checkpoint["mode"] == "full"):
+        mode, cursor = checkpoint["mode"], checkpoint["cursor"]
+        print(f"\nResuming {object_type} {mode} sync after "
+              f"{checkpoint['rows_fetched']} rows...")
+        writer = TableWriter(con, staging, column_types, replace=False)
+        writer.rows_written = checkpoint["rows_fetched"]
+    else:
+        mode = "incremental" if watermark else "full"
+        if watermark:
+            print(f"\nFetching {object_type} modified since {watermark}...")
+            # The watermark never moves back, even if only the overlap is re-fetched
+            cursor = {"since": shift_timestamp(watermark, -SYNC_OVERLAP), "after": None, "latest": watermark}
+        else:
+            print(f"\nFetching all {object_type}...")
+            listing_started = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+            cursor = {"since": None, "after": None, "latest": shift_timestamp(listing_started, -SYNC_OVERLAP)}
+        writer = TableWriter(con, staging, column_types)
+    
+    latest = cursor.get("latest")
+    if cursor.get("done"):
+        # Every page was committed before the sync stopped; only the swap is left
+        pages = iter(())
+    elif mode == "incremental":
+        pages = client.iter_modified_since(object_type, cursor["since"], after=cursor["after"])
+    else:
+        pages = ((page, {"after": after} if after else None)
+                 for page, after in client.iter_pages(object_type, after=cursor["after"]))
     
-    count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-    print(f"  Saved {count} rows to {table_name}")
+    for page, next_cursor in timed(pages, f"fetch {object_type}"):
+        page_latest = max_modified(page, object_type) if mode == "incremental" else None
+        if page_latest and (latest is None or to_epoch_ms(page_latest) > to_epoch_ms(latest)):
+            latest = page_latest
+        
+        with stage(f"flatten {object_type}", rows=len(page)):
+            # When the row was fetched, for follow-up steps that only
+            # process rows synced since their last run
+            synced_at = datetime.utcnow()
+            rows = [{**flatten_hubspot_object(obj), "synced_at": synced_at} for obj in page]
+        
+        with stage(f"load {object_type}", rows=len(rows)):
+            with transaction(con):
+                writer.write(rows)
+                # The last page marks the checkpoint done, so a resume does not fetch it again
+                save_checkpoint(con, object_type, mode, {**(next_cursor or {"done": True}), "latest": latest},
+                                writer.rows_written)
+        
+        print(f"  Fetched {writer.rows_written} {object_type}...")
     
-    con.close()
-    json_path.unlink()  # Clean up JSON
+    return mode, latest, writer.rows_written
 
-def sync_data(client: HubSpotClient, objects: list = None):
-    """Sync HubSpot data to local cache."""
-    objects = objects or ["contacts", "companies", "deals", "pipelines", "owners"]
+def save_object(con, object_type: str, mode: str, latest: Optional[str], rows: int) -> int:
+    """
+    Apply the fetched `<object>__staging` table (see `fetch_object`) to the
+    cache `con`.
     
-    print(f"Syncing HubSpot data: {', '.join(objects)}")
+    An incremental fetch is merged into the existing table by id, a full
+    one replaces it. The object's rollup and watermark follow.
+    """
+    staging = f"{object_type}__staging"
+    if not table_exists(con, staging):
+        print(f"  No {'changes' if mode == 'incremental' else 'data'} to save for {object_type}")
+    elif mode == "incremental":
+        if object_type == "deals":
+            classify_deals(con, staging)
+        dates = changed_dates(con, staging) if object_type in ROLLUPS else None
+        with stage(f"merge {object_type}"):
+            # Tables cached before a column gained a type are converted in place
+            apply_column_types(con, object_type, COLUMN_TYPES)
+            widen_enum_columns(con, object_type, staging)
+            merge_table(con, staging, object_type, key="id", order_by="updated_at")
+            encode_enums(con, object_type)
+        print(f"  Merged {rows} changed rows into {object_type}")
+        if object_type in ROLLUPS:
+            with stage(f"rollup {object_type}"):
+                refresh_rollup(con, object_type, dates)
+    else:
+        if object_type == "deals":
+            classify_deals(con, staging)
+        with stage(f"swap {object_type}"):
+            replace_table(con, staging, object_type)
+            encode_enums(con, object_type)
+        print(f"  Saved {rows} rows to {object_type}")
+        if object_type in ROLLUPS:
+            with stage(f"rollup {object_type}"):
+                refresh_rollup(con, object_type)
+    
+    if table_exists(con, object_type):
+        record_schema(con, object_type)
+    if latest:
+        set_watermark(con, object_type, latest)
+    return rows
+
+# Won / closed classification of a deal joined to its stage `s`. Stage ids
+# without synced metadata fall back to HubSpot's default stage ids.
+DEAL_IS_CLOSED_SQL = "coalesce(s.is_closed, d.dealstage IN ('closedwon', 'closedlost'))"
+DEAL_IS_WON_SQL = "coalesce(s.is_closed AND s.probability >= 1.0, d.dealstage = 'closedwon')"
+
+def classify_deals(con, table_name: str = "deals") -> list:
+    """
+    Store is_won / is_lost / is_open flags on every deal in `table_name`.
     
-    if "contacts" in objects:
-        print("\nFetching contacts...")
-        contacts = client.get_all_contacts()
-        save_to_duckdb(contacts, "contacts")
+    The flags are derived once from deal_stages at sync time so dashboards
+    can filter on booleans instead of matching stage ids. Only deals whose
+    flags change are rewritten; their creation dates are returned.
+    """
+    stages = "deal_stages" if table_exists(con, "deal_stages") else (
+        "(SELECT NULL::VARCHAR AS id, NULL::BOOLEAN AS is_closed, NULL::DOUBLE AS probability)")
+    table = quote_identifier(table_name)
+    
+    with transaction(con):
+        for flag in ("is_won", "is_lost", "is_open"):
+            con.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {flag} BOOLEAN")
+        if "dealstage" not in table_columns(con, table_name):
+            return []
+        rows = con.execute(f"""
+            UPDATE {table} SET
+                is_won = c.is_won,
+                is_lost = c.is_lost,
+                is_open = c.is_open
+            FROM (
+                SELECT id, is_won, is_closed AND NOT is_won AS is_lost, NOT is_closed AS is_open
+                FROM (
+                    SELECT d.id,
+                           coalesce({DEAL_IS_CLOSED_SQL}, false) AS is_closed,
+                           coalesce({DEAL_IS_WON_SQL}, false) AS is_won
+                    FROM {table} d
+                    LEFT JOIN {stages} s ON d.dealstage = s.id
+                )
+            ) c
+            WHERE {table}.id = c.id
+              AND ({table}.is_won IS DISTINCT FROM c.is_won
+                   OR {table}.is_lost IS DISTINCT FROM c.is_lost
+                   OR {table}.is_open IS DISTINCT FROM c.is_open)
+            RETURNING CAST(created_at AS DATE)
+        """).fetchall()
+    return sorted({row[0] for row in rows if row[0] is not None})
+
+# Daily rollups maintained at sync time for the dashboards, keyed by the
+# object's creation date: object type -> (rollup table, aggregate query)
+ROLLUPS = {
+    "deals": ("deals_daily", """
+        SELECT CAST(created_at AS DATE) AS created_date,
+               pipeline,
+               dealstage,
+               hubspot_owner_id,
+               count(*) AS deals,
+               count(*) FILTER (WHERE is_won) AS won_deals,
+               count(*) FILTER (WHERE is_lost) AS lost_deals,
+               count(*) FILTER (WHERE is_open) AS open_deals,
+               sum(amount) AS amount,
+               sum(amount) FILTER (WHERE is_won) AS won_amount,
+               sum(amount) FILTER (WHERE is_open) AS open_amount
+        FROM deals
+        {where}
+        GROUP BY ALL
+    """),
+    "contacts": ("contacts_daily", """
+        SELECT CAST(created_at AS DATE) AS created_date,
+               lifecyclestage,
+               count(*) AS contacts
+        FROM contacts
+        {where}
+        GROUP BY ALL
+    """),
+}
+
+def refresh_rollup(con, object_type: str, dates: list = None):
+    """
+    Refresh the daily rollup of `object_type`.
     
-    if "companies" in objects:
-        print("\nFetching companies...")
-        companies = client.get_all_companies()
-        save_to_duckdb(companies, "companies")
+    With `dates` only the rollup rows for those creation dates are
+    recomputed; otherwise (or when the rollup does not exist yet) it is
+    rebuilt from scratch and swapped in.
+    """
+    rollup, query = ROLLUPS[object_type]
+    
+    # Grouping columns inherit the source's ENUM types; once those gain
+    # values the existing rows no longer fit and the rollup is rebuilt
+    if dates is None or not table_exists(con, rollup) or enum_types_changed(con, object_type, rollup):
+        staging = f"{rollup}__staging"
+        con.execute(f"DROP TABLE IF EXISTS {staging}")
+        con.execute(f"CREATE TABLE {staging} AS {query.format(where='')}")
+        replace_table(con, staging, rollup)
+        print(f"  Rebuilt {rollup}")
+        return
     
-    if "deals" in objects:
-        print("\nFetching deals...")
-        deals = client.get_all_deals()
-        save_to_duckdb(deals, "deals")
+    if not dates:
+        return
     
+    with transaction(con):
+        con.execute(f"DELETE FROM {rollup} WHERE created_date IN (SELECT unnest(?::DATE[]))", [dates])
+        con.execute(f"INSERT INTO {rollup} BY NAME {query.format(where='WHERE CAST(created_at AS DATE) IN (SELECT unnest(?::DATE[]))')}",
+                    [dates])
+    print(f"  Refreshed {len(dates)} days of {rollup}")
+
+def enum_types_changed(con, source: str, target: str) -> bool:
+    """Whether a column of `target` differs in ENUM type from the same column of `source`."""
+    source_columns = table_columns(con, source)
+    return any(
+        column_type != source_columns[column]
+        for column, column_type in table_columns(con, target).items()
+        if column in source_columns and "ENUM(" in column_type + source_columns[column]
+    )
+
+def known_enum_values(con) -> dict:
+    """Values of ENUM columns known from pipeline and owner metadata, by column."""
+    values = {}
+    if table_exists(con, "deal_stages"):
+        rows = con.execute("SELECT id, pipeline_id FROM deal_stages").fetchall()
+        values["dealstage"] = [row[0] for row in rows]
+        values["pipeline"] = [row[1] for row in rows]
+    if table_exists(con, "owners"):
+        values["hubspot_owner_id"] = [row[0] for row in con.execute("SELECT id FROM owners").fetchall()]
+    return values
+
+def encode_enums(con, object_type: str) -> list:
+    """Store the low-cardinality properties of `object_type` as ENUM columns."""
+    return encode_enum_columns(con, object_type, ENUM_COLUMNS.get(object_type, []),
+                               known_enum_values(con), MAX_ENUM_VALUES)
+
+def changed_dates(con, table_name: str) -> list:
+    """Creation dates of the rows in `table_name`."""
+    rows = con.execute(
+        f"SELECT DISTINCT CAST(created_at AS DATE) FROM {quote_identifier(table_name)} WHERE created_at IS NOT NULL"
+    ).fetchall()
+    return sorted(row[0] for row in rows)
+
+def save_deal_stages(con, pipelines: list) -> int:
+    """Flatten pipeline stages into deal_stages__staging, returning their count."""
+    stages = []
+    for pipeline in pipelines:
+        for pipeline_stage in pipeline.get("stages", []):
+            metadata = pipeline_stage.get("metadata", {})
+            stages.append({
+                "id": pipeline_stage["id"],
+                "label": pipeline_stage["label"],
+                "display_order": pipeline_stage["displayOrder"],
+                "pipeline_id": pipeline["id"],
+                "pipeline_label": pipeline["label"],
+                "is_closed": str(metadata.get("isClosed", "false")).lower() == "true",
+                "probability": float(metadata["probability"]) if metadata.get("probability") else None
+            })
+    
+    writer = TableWriter(con, "deal_stages__staging")
+    writer.write(stages)
+    print(f"  Fetched {len(stages)} deal stages")
+    return len(stages)
+
+def save_owners(con, owners: list) -> int:
+    """Store HubSpot owners in owners__staging, returning their count."""
+    owner_data = [{
+        "id": o["id"],
+        "email": o.get("email"),
+        "first_name": o.get("firstName"),
+        "last_name": o.get("lastName"),
+        "user_id": o.get("userId")
+    } for o in owners]
+    
+    writer = TableWriter(con, "owners__staging")
+    writer.write(owner_data)
+    print(f"  Fetched {len(owner_data)} owners")
+    return len(owner_data)
+
+def synced_tables(objects: list) -> list:
+    """Tables sync_data rewrites when syncing `objects`."""
+    tables = [o for o in ("contacts", "companies", "deals") if o in objects]
+    tables += [ROLLUPS[o][0] for o in tables if o in ROLLUPS]
     if "pipelines" in objects:
-        print("\nFetching pipelines...")
-        pipelines = client.get_pipelines()
-        # Flatten pipeline stages
-        stages = []
-        for pipeline in pipelines:
-            for stage in pipeline.get("stages", []):
-                stages.append({
-                    "id": stage["id"],
-                    "label": stage["label"],
-                    "display_order": stage["displayOrder"],
-                    "pipeline_id": pipeline["id"],
-                    "pipeline_label": pipeline["label"]
-                })
+        # Reclassifying deals after a pipeline change also refreshes deals_daily
+        tables.append("deal_stages")
+        if "deals_daily" not in tables:
+            tables.append("deals_daily")
+    if "owners" in objects:
+        tables.append("owners")
+    return tables
+
+def sync_data(client: HubSpotClient, objects: list = None, full: bool = False,
+              workers: int = DEFAULT_SYNC_WORKERS, snapshot: bool = SNAPSHOTS):
+    """
+    Sync HubSpot data to local cache.
+    
+    Contacts, companies and deals are synced incrementally from the stored
+    watermark unless `full` is set or no previous sync exists.
+    
+    Objects are fetched concurrently on `workers` threads that share the
+    client's rate limiter. Each thread streams its pages into the staging
+    database through its own cursor, so memory stays bounded to a few pages
+    per object. The cache is only opened read-write briefly to read the
+    watermarks and once everything is fetched to swap the new rows in, so
+    readers in other processes (e.g. Evidence) are not locked out while
+    HubSpot is paged through. Objects fetched before another one failed
+    are still saved.
+    
+    With `snapshot` every table the sync changed is also written as a
+    Parquet snapshot (see duckdb_utils.write_snapshot).
+    """
+    objects = objects or ["contacts", "companies", "deals", "pipelines", "owners"]
+    
+    print(f"Syncing HubSpot data: {', '.join(objects)}")
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    start_run("hubspot")
+    
+    with duckdb.connect(str(DUCKDB_PATH)) as con:
+        create_sync_state(con)
+        create_schema_cache(con)
+        watermarks = {
+            object_type: None if full else get_watermark(con, object_type)
+            for object_type in ("contacts", "companies", "deals")
+            if object_type in objects
+        }
+        schemas = {object_type: cached_schema(con, object_type) for object_type in watermarks}
+    
+    with duckdb.connect(str(STAGING_PATH)) as work:
+        create_checkpoint_table(work)
         
-        if stages:
-            json_path = DATA_DIR / 'deal_stages.json'
-            with open(json_path, 'w') as f:
-                json.dump(stages, f)
+        fetched, error = {}, None
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(fetch_object, work.cursor(), client, object_type, watermark,
+                            schemas[object_type]): object_type
+                for object_type, watermark in watermarks.items()
+            }
+            if "pipelines" in objects:
+                print("\nFetching pipelines...")
+                futures[pool.submit(
+                    lambda cur: save_deal_stages(cur, client.get_pipelines()), work.cursor())] = "pipelines"
+            if "owners" in objects:
+                print("\nFetching owners...")
+                futures[pool.submit(
+                    lambda cur: save_owners(cur, client.get_owners()), work.cursor())] = "owners"
             
-            con = duckdb.connect(str(DUCKDB_PATH))
-            con.execute("DROP TABLE IF EXISTS deal_stages")
-            con.execute(f"CREATE TABLE deal_stages AS SELECT * FROM read_json_auto('{json_path}')")
-            print(f"  Saved {len(stages)} deal stages")
-            con.close()
-            json_path.unlink()
-    
-    if "owners" in objects:
-        print("\nFetching owners...")
-        owners = client.get_owners()
-        owner_data = [{
-            "id": o["id"],
-            "email": o.get("email"),
-            "first_name": o.get("firstName"),
-            "last_name": o.get("lastName"),
-            "user_id": o.get("userId")
-        } for o in owners]
+            for future in as_completed(futures):
+                try:
+                    fetched[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"  Error fetching {futures[future]}: {e}")
+                    error = error or e
         
-        if owner_data:
-            json_path = DATA_DIR / 'owners.json'
-            with open(json_path, 'w') as f:
-                json.dump(owner_data, f)
+        rows = 0
+        with attached(work, DUCKDB_PATH, "cache") as con:
+            try:
+                # Stages and owners go first, deals are classified and encoded against them
+                for name, table in (("pipelines", "deal_stages"), ("owners", "owners")):
+                    if name in fetched and copy_table(con, work, f"{table}__staging"):
+                        replace_table(con, f"{table}__staging", table)
+                        print(f"  Saved {fetched[name]} rows to {table}")
+                    clear_checkpoint(work, name, f"{table}__staging")
+                
+                for object_type in watermarks:
+                    if object_type in fetched:
+                        copy_table(con, work, f"{object_type}__staging")
+                        rows += save_object(con, object_type, *fetched[object_type])
+                        clear_checkpoint(work, object_type, f"{object_type}__staging")
+                
+                # Stage metadata may have changed under deals that were not re-fetched
+                if "pipelines" in fetched and table_exists(con, "deals"):
+                    with stage("rollup deals"):
+                        refresh_rollup(con, "deals", classify_deals(con))
+                
+                if snapshot:
+                    with stage("snapshots"):
+                        for table in synced_tables(list(fetched)):
+                            if table_exists(con, table):
+                                write_snapshot(con, table, DATA_DIR)
+                if error:
+                    raise error
+            except Exception as e:
+                finish(con, DATA_DIR / 'sync_runs.jsonl', rows, status="failed", error=str(e))
+                raise
             
-            con = duckdb.connect(str(DUCKDB_PATH))
-            con.execute("DROP TABLE IF EXISTS owners")
-            con.execute(f"CREATE TABLE owners AS SELECT * FROM read_json_auto('{json_path}')")
-            print(f"  Saved {len(owner_data)} owners")
-            con.close()
-            json_path.unlink()
+            finish(con, DATA_DIR / 'sync_runs.jsonl', rows)
     
     print(f"\nData synced to {DUCKDB_PATH}")
+    print(f"API usage: {client.retry_stats.summary()}")
 
 
 # ============================================
@@ -394,12 +976,78 @@ def log_action(action_name: str, details: dict, success: bool = True):
     with open(ACTIONS_LOG, 'a') as f:
         f.write(json.dumps(log_entry) + "\n")
 
-def action_stale_deals_reminder(client: HubSpotClient, days_stale: int = 14):
+def open_cache(tables: list):
+    """
+    Open the local cache read-only for action planning.
+    
+    Returns None when the cache is missing any of `tables`, in which case
+    actions fall back to the live search API.
+    """
+    if not DUCKDB_PATH.exists():
+        return None
+    con = duckdb.connect(str(DUCKDB_PATH), read_only=True)
+    if not all(table_exists(con, t) for t in tables):
+        con.close()
+        return None
+    return con
+
+def plan_stale_deals(con, days_stale: int) -> list:
+    """Select open, owned deals not modified in `days_stale` days from the cache."""
+    stale_before = datetime.utcnow() - timedelta(days=days_stale)
+    
+    rows = con.execute(f"""
+        SELECT d.id, d.dealname, d.amount, d.dealstage, d.hubspot_owner_id,
+               coalesce(d.hs_lastmodifieddate, d.updated_at) AS last_modified
+        FROM deals d
+        LEFT JOIN deal_stages s ON d.dealstage = s.id
+        WHERE coalesce(d.hs_lastmodifieddate, d.updated_at) < ?
+          AND NOT coalesce(d.archived, false)
+          AND NOT {DEAL_IS_CLOSED_SQL}
+          AND d.hubspot_owner_id IS NOT NULL
+        ORDER BY last_modified
+    """, [stale_before]).fetchall()
+    
+    return [{
+        "id": deal_id,
+        "properties": {
+            "dealname": name,
+            "amount": str(amount) if amount is not None else None,
+            "dealstage": stage_id,
+            "hubspot_owner_id": owner_id,
+            "hs_lastmodifieddate": last_modified.isoformat() + "Z" if last_modified else None
+        }
+    } for deal_id, name, amount, stage_id, owner_id, last_modified in rows]
+
+def won_deal_ids(con, deal_ids: list) -> set:
+    """Return the subset of `deal_ids` that are closed-won in the cache."""
+    if not deal_ids:
+        return set()
+    rows = con.execute(f"""
+        SELECT d.id
+        FROM deals d
+        LEFT JOIN deal_stages s ON d.dealstage = s.id
+        WHERE d.id IN (SELECT unnest(?::VARCHAR[]))
+          AND {DEAL_IS_WON_SQL}
+    """, [list(deal_ids)]).fetchall()
+    return {row[0] for row in rows}
+
+def action_stale_deals_reminder(client: HubSpotClient, days_stale: int = 14, use_cache: bool = True):
     """
     Find deals that haven't been updated in X days and create tasks for owners.
+    
+    Stale deals are selected from the synced local cache when available, so
+    the action is not limited by the search API's page size or result cap;
+    only task creation hits the API.
     """
     print(f"\nFinding deals stale for {days_stale}+ days...")
     
+    con = open_cache(["deals", "deal_stages"]) if use_cache else None
+    if con:
+        stale_deals = plan_stale_deals(con, days_stale)
+        con.close()
+        print(f"Found {len(stale_deals)} stale deals in local cache")
+        return create_stale_deal_tasks(client, stale_deals)
+    
     stale_date = (datetime.utcnow() - timedelta(days=days_stale)).strftime("%Y-%m-%d")
     
     # Search for stale deals
@@ -422,8 +1070,17 @@ def action_stale_deals_reminder(client: HubSpotClient, days_stale: int = 14):
     )
     
     print(f"Found {len(stale_deals)} stale deals")
+    return create_stale_deal_tasks(client, stale_deals)
+
+def create_stale_deal_tasks(client: HubSpotClient, stale_deals: list) -> int:
+    """
+    Create a follow-up task for the owner of each stale deal.
     
-    tasks_created = 0
+    Every batch of tasks is logged as soon as HubSpot accepts it, so the
+    tasks of earlier batches stay on record when a later batch fails.
+    """
+    tasks = []
+    task_deals = {}
     for deal in stale_deals:
         props = deal.get("properties", {})
         owner_id = props.get("hubspot_owner_id")
@@ -431,8 +1088,8 @@ def action_stale_deals_reminder(client: HubSpotClient, days_stale: int = 14):
         if not owner_id:
             continue
         
-        # Create follow-up task
-        task = client.create_task(
+        # Follow-up task for the deal owner
+        tasks.append(build_task(
             subject=f"Follow up on stale deal: {props.get('dealname', 'Unknown')}",
             body=f"This deal hasn't been updated since {props.get('hs_lastmodifieddate', 'unknown')}. Please review and update.",
             owner_id=owner_id,
@@ -440,73 +1097,218 @@ def action_stale_deals_reminder(client: HubSpotClient, days_stale: int = 14):
                 "to": {"id": deal["id"]},
                 "types": [{"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": 216}]
             }]
-        )
-        
-        tasks_created += 1
+        ))
+        task_deals[deal["id"]] = props.get("dealname")
+    
+    def chunk_deals(chunk):
+        deal_ids = [task["associations"][0]["to"]["id"] for task in chunk]
+        return [{"deal_id": deal_id, "deal_name": task_deals[deal_id]} for deal_id in deal_ids]
+    
+    logged = 0
+    def log_chunk(chunk, created):
+        nonlocal logged
+        logged += len(chunk)
+        log_action("stale_deal_reminder", {
+            "deals": chunk_deals(chunk),
+            "task_ids": [task.get("id") for task in created]
+        }, success=len(created) == len(chunk))
+    
+    try:
+        created = client.create_tasks(tasks, on_chunk=log_chunk) if tasks else []
+    except Exception as e:
+        # The failed batch may or may not have been applied; record it for review
         log_action("stale_deal_reminder", {
-            "deal_id": deal["id"],
-            "deal_name": props.get("dealname"),
-            "task_id": task.get("id")
-        })
+            "deals": chunk_deals(tasks[logged:logged + BATCH_SIZE]),
+            "error": str(e)
+        }, success=False)
+        raise
     
+    tasks_created = len(created)
     print(f"Created {tasks_created} follow-up tasks")
     return tasks_created
 
-def action_lifecycle_stage_update(client: HubSpotClient):
+def won_deal_ids_live(client: HubSpotClient, deal_ids: list) -> set:
+    """Return the subset of `deal_ids` that are closed-won, read from the API."""
+    if not deal_ids:
+        return set()
+    stages = {stage["id"]: stage.get("metadata", {})
+              for pipeline in client.get_pipelines() for stage in pipeline.get("stages", [])}
+    
+    def is_won(stage_id):
+        # Same rule as DEAL_IS_WON_SQL
+        metadata = stages.get(stage_id)
+        if metadata is None:
+            return stage_id == "closedwon"
+        closed = str(metadata.get("isClosed", "false")).lower() == "true"
+        return closed and float(metadata.get("probability") or 0) >= 1.0
+    
+    deals = client.batch_read("deals", deal_ids, ["dealstage"])
+    return {deal["id"] for deal in deals if is_won(deal.get("properties", {}).get("dealstage"))}
+
+def action_lifecycle_stage_update(client: HubSpotClient, use_cache: bool = True,
+                                  apply: bool = APPLY_LIFECYCLE_UPDATES):
     """
     Update lifecycle stage for contacts based on deal status.
     Contacts with closed-won deals → Customer
-    """
-    print("\nUpdating lifecycle stages based on deal status...")
     
-    # This is simplified - in reality you'd want to check deal associations
-    # For now, just showing the pattern
-    
-    filters = [
-        {
-            "propertyName": "lifecyclestage",
-            "operator": "EQ",
-            "value": "opportunity"
-        }
-    ]
+    Opportunities and deal outcomes are read from the synced local cache
+    when available, otherwise from the live API; either way the contacts'
+    deals are looked up through the associations API.
     
-    opportunities = client.search_contacts(filters)
-    print(f"Found {len(opportunities)} opportunities to check")
-    
-    # In a real implementation, you'd check if these contacts
-    # have associated closed-won deals and update accordingly
+    Nothing is written to HubSpot unless `apply` is set (--apply, or
+    HUBSPOT_APPLY_LIFECYCLE_UPDATES=1); otherwise the planned updates are
+    only printed and logged.
+    """
+    print("\nUpdating lifecycle stages based on deal status...")
     
-    updated = 0
-    # for contact in opportunities:
-    #     # Check for closed-won deals...
-    #     # client.update_contact(contact["id"], {"lifecyclestage": "customer"})
-    #     updated += 1
+    con = open_cache(["contacts", "deals", "deal_stages"]) if use_cache else None
+    if con:
+        opportunity_ids = [row[0] for row in con.execute("""
+            SELECT id FROM contacts
+            WHERE lifecyclestage = 'opportunity' AND NOT coalesce(archived, false)
+        """).fetchall()]
+        print(f"Found {len(opportunity_ids)} opportunities to check in local cache")
+    else:
+        filters = [
+            {
+                "propertyName": "lifecyclestage",
+                "operator": "EQ",
+                "value": "opportunity"
+            }
+        ]
+        opportunity_ids = [contact["id"] for contact in client.search_contacts(filters)]
+        print(f"Found {len(opportunity_ids)} opportunities to check")
+    
+    contact_deals = client.batch_read_associations("contacts", "deals", opportunity_ids)
+    associated_ids = sorted({d for deals in contact_deals.values() for d in deals})
+    if con:
+        won = won_deal_ids(con, associated_ids)
+        con.close()
+    else:
+        won = won_deal_ids_live(client, associated_ids)
     
-    log_action("lifecycle_stage_update", {"checked": len(opportunities), "updated": updated})
-    print(f"Updated {updated} contacts")
+    updates = {
+        contact_id: {"lifecyclestage": "customer"}
+        for contact_id, deal_ids in contact_deals.items()
+        if won.intersection(deal_ids)
+    }
+    if apply:
+        updated = len(client.update_contacts(updates)) if updates else 0
+        print(f"Updated {updated} contacts")
+    else:
+        updated = 0
+        print(f"Dry run: would update {len(updates)} contacts (pass --apply to write them)")
+    
+    log_action("lifecycle_stage_update", {
+        "checked": len(opportunity_ids),
+        "updated": updated,
+        "contact_ids": sorted(updates),
+        "dry_run": not apply
+    })
     return updated
 
-def action_deal_stage_velocity(client: HubSpotClient):
+def stage_transitions(deal: dict) -> list:
+    """Turn a deal's dealstage history into one row per stage it entered."""
+    history = sorted(deal.get("propertiesWithHistory", {}).get("dealstage", []),
+                     key=lambda change: change["timestamp"])
+    
+    entries = []
+    for change in history:
+        if change.get("value") and (not entries or entries[-1]["dealstage"] != change["value"]):
+            entries.append({"dealstage": change["value"], "entered_at": change["timestamp"]})
+    
+    return [{
+        "deal_id": deal["id"],
+        "dealstage": entry["dealstage"],
+        "entered_at": entry["entered_at"],
+        "exited_at": entries[i + 1]["entered_at"] if i + 1 < len(entries) else None
+    } for i, entry in enumerate(entries)]
+
+def sync_stage_history(con, client: HubSpotClient, full: bool = False) -> int:
+    """
+    Refresh deal_stage_transitions for deals changed since the last run.
+    
+    Changed deals are read from the local deals table and their dealstage
+    history is fetched with batch reads, so only deals synced since the
+    stored watermark cost an API call. The watermark is the deals' synced_at
+    rather than their modification time, because a deal can reach the cache
+    after deals modified later than it (e.g. through search index lag).
+    """
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS deal_stage_transitions (
+            deal_id VARCHAR,
+            dealstage VARCHAR,
+            entered_at TIMESTAMP,
+            exited_at TIMESTAMP
+        )
+    """)
+    watermark = None if full else get_watermark(con, "deal_stage_transitions")
+    
+    # Deals cached before synced_at existed are all treated as changed
+    synced_at = "synced_at" if "synced_at" in table_columns(con, "deals") else "NULL::TIMESTAMP"
+    query = f"SELECT id, {synced_at} FROM deals"
+    params = []
+    if watermark and synced_at == "synced_at":
+        query += " WHERE synced_at > CAST(? AS TIMESTAMP)"
+        params = [watermark]
+    changed = con.execute(query, params).fetchall()
+    
+    if not changed:
+        print("  No changed deals")
+        return 0
+    
+    ids = [row[0] for row in changed]
+    latest = max((row[1] for row in changed if row[1]), default=None)
+    print(f"  Fetching stage history for {len(ids)} deals...")
+    
+    writer = TableWriter(con, "deal_stage_transitions", COLUMN_TYPES, replace=False)
+    for start in range(0, len(ids), HISTORY_BATCH_SIZE):
+        chunk = ids[start:start + HISTORY_BATCH_SIZE]
+        deals = client.batch_read("deals", chunk, ["dealstage"], properties_with_history=["dealstage"])
+        
+        with transaction(con):
+            con.execute("DELETE FROM deal_stage_transitions WHERE deal_id IN (SELECT unnest(?::VARCHAR[]))",
+                        [chunk])
+            writer.write([row for deal in deals for row in stage_transitions(deal)])
+    
+    if latest:
+        set_watermark(con, "deal_stage_transitions", latest.isoformat())
+    print(f"  Saved {writer.rows_written} stage transitions")
+    return len(ids)
+
+def action_deal_stage_velocity(client: HubSpotClient, full: bool = False, snapshot: bool = SNAPSHOTS):
     """
-    Analyze deal stage velocity and flag deals stuck too long.
-    This just syncs data - the actual analysis happens in Evidence dashboard.
+    Capture stage transitions of changed deals for velocity analysis.
+    The analysis itself happens in the Evidence dashboard.
     """
-    print("\nSyncing deal data for velocity analysis...")
+    print("\nSyncing deal stage history for velocity analysis...")
     
-    # Just sync deals with extra properties
-    deals = client.get_all_deals(properties=[
-        "dealname", "amount", "dealstage", "pipeline",
-        "closedate", "createdate", "hs_lastmodifieddate",
-        "hubspot_owner_id", "hs_date_entered_*"  # Stage entry dates
-    ])
+    con = duckdb.connect(str(DUCKDB_PATH)) if DUCKDB_PATH.exists() else None
+    if con is None or not table_exists(con, "deals"):
+        print("  No cached deals, run sync first")
+        if con:
+            con.close()
+        return 0
     
-    save_to_duckdb(deals, "deals")
-    log_action("deal_velocity_sync", {"deals_synced": len(deals)})
-    return len(deals)
+    create_sync_state(con)
+    synced = sync_stage_history(con, client, full=full)
+    if snapshot and table_exists(con, "deal_stage_transitions"):
+        write_snapshot(con, "deal_stage_transitions", DATA_DIR)
+    con.close()
+    
+    log_action("deal_velocity_sync", {"deals_synced": synced})
+    return synced
 
 
-def run_daily_automation(client: HubSpotClient):
-    """Run all daily HubSpot automations."""
+def run_daily_automation(client: HubSpotClient, apply: bool = APPLY_LIFECYCLE_UPDATES):
+    """
+    Run all daily HubSpot automations.
+    
+    The lifecycle update is a dry run unless `apply` is set.
+    
+    sync_all.py runs the same steps as part of the refresh of every source,
+    starting the actions in parallel as soon as the sync is done.
+    """
     print("=" * 50)
     print(f"Running daily HubSpot automation - {datetime.utcnow().isoformat()}")
     print("=" * 50)
@@ -516,7 +1318,7 @@ def run_daily_automation(client: HubSpotClient):
     
     # 2. Run actions
     action_stale_deals_reminder(client, days_stale=14)
-    action_lifecycle_stage_update(client)
+    action_lifecycle_stage_update(client, apply=apply)
     action_deal_stage_velocity(client)
     
     print("\n" + "=" * 50)
@@ -535,13 +1337,25 @@ def main():
     # Sync command
     sync_parser = subparsers.add_parser("sync", help="Sync HubSpot data")
     sync_parser.add_argument("--objects", type=str, help="Comma-separated list of objects to sync")
+    sync_parser.add_argument("--full", action="store_true",
+                             help="Re-download everything instead of syncing changes since the last run")
+    sync_parser.add_argument("--workers", type=int, default=DEFAULT_SYNC_WORKERS,
+                             help="Number of object types to fetch in parallel")
+    sync_parser.add_argument("--snapshot", action="store_true",
+                             help="Also write Parquet snapshots of the synced tables")
     
     # Action command
     action_parser = subparsers.add_parser("action", help="Run a specific action")
     action_parser.add_argument("name", type=str, help="Action name to run")
+    action_parser.add_argument("--live", action="store_true",
+                               help="Plan against the live search API instead of the local cache")
+    action_parser.add_argument("--apply", action="store_true",
+                               help="Write lifecycle updates to HubSpot instead of only listing them")
     
     # Daily command
-    subparsers.add_parser("daily", help="Run daily automation")
+    daily_parser = subparsers.add_parser("daily", help="Run daily automation")
+    daily_parser.add_argument("--apply", action="store_true",
+                              help="Write lifecycle updates to HubSpot instead of only listing them")
     
     args = parser.parse_args()
     
@@ -555,12 +1369,14 @@ def main():
     
     if args.command == "sync":
         objects = args.objects.split(",") if args.objects else None
-        sync_data(client, objects)
+        sync_data(client, objects, full=args.full, workers=args.workers,
+                  snapshot=SNAPSHOTS or args.snapshot)
     
     elif args.command == "action":
         actions = {
-            "stale_deals": lambda: action_stale_deals_reminder(client),
-            "lifecycle_update": lambda: action_lifecycle_stage_update(client),
+            "stale_deals": lambda: action_stale_deals_reminder(client, use_cache=not args.live),
+            "lifecycle_update": lambda: action_lifecycle_stage_update(
+                client, use_cache=not args.live, apply=APPLY_LIFECYCLE_UPDATES or args.apply),
             "deal_velocity": lambda: action_deal_stage_velocity(client),
         }
         
@@ -572,7 +1388,7 @@ def main():
             sys.exit(1)
     
     elif args.command == "daily":
-        run_daily_automation(client)
+        run_daily_automation(client, apply=APPLY_LIFECYCLE_UPDATES or args.apply)
     
     else:
         parser.print_help()
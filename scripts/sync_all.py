@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Sync Orchestrator
+
+Runs every sync and follow-up action as one nightly refresh:
+1. Tasks declare the tasks they depend on and the DuckDB files they read or write
+2. Independent tasks run in parallel, each in its own process
+3. A task starts as soon as its dependencies have finished and its files are free
+
+Each task runs once per invocation, however many requested tasks depend on
+it, so the refresh takes roughly as long as its slowest dependency chain.
+
+A DuckDB file can have one writer or several readers across processes, so a
+task writing a file waits for every other task using it, while tasks that
+only read it may run together.
+
+Usage:
+    python scripts/sync_all.py [task ...] [--full] [--snapshot] [--apply-lifecycle-updates]
+                               [--workers N] [--dry-run] [--verbose]
+
+    Without task names every task runs; naming tasks also runs what they depend on.
+    --full passes the full-resync flag to every source
+    --snapshot makes every source also write Parquet snapshots (SYNC_SNAPSHOTS)
+    --apply-lifecycle-updates lets lifecycle_update write to HubSpot instead of
+    only logging the planned updates (HUBSPOT_APPLY_LIFECYCLE_UPDATES)
+    --dry-run prints the order tasks would start in without running them
+    --verbose shows the tasks' output instead of writing it to data/sync_logs/
+
+Tasks:
+    hubspot           HubSpot CRM sync (hubspot.py sync)
+    posthog           PostHog events and persons (sync_posthog.py)
+    athena            Athena queries (sync_athena.py)
+    stale_deals       HubSpot stale deal reminders, after hubspot
+    lifecycle_update  HubSpot lifecycle stage updates (dry run by default), after hubspot
+    deal_velocity     HubSpot deal stage history, after hubspot
+
+A task whose environment variables are missing is skipped, together with
+the tasks depending on it.
+"""
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+LOG_DIR = DATA_DIR / 'sync_logs'
+
+HUBSPOT_DB = 'hubspot_cache.duckdb'
+POSTHOG_DB = 'posthog_cache.duckdb'
+ATHENA_DB = 'athena_cache.duckdb'
+
+
+# ----------------------------------------
+# Tasks (run in worker processes)
+# ----------------------------------------
+
+def hubspot_client():
+    import hubspot
+    return hubspot, hubspot.HubSpotClient(os.environ["HUBSPOT_ACCESS_TOKEN"])
+
+def run_hubspot(full: bool):
+    hubspot, client = hubspot_client()
+    hubspot.sync_data(client, full=full)
+
+def run_posthog(full: bool):
+    import sync_posthog
+    sys.argv = ['sync_posthog.py'] + (['--full'] if full else [])
+    sync_posthog.main()
+
+def run_athena(full: bool):
+    import sync_athena
+    sys.argv = ['sync_athena.py'] + (['--full'] if full else [])
+    sync_athena.main()
+
+def run_stale_deals(full: bool):
+    hubspot, client = hubspot_client()
+    hubspot.action_stale_deals_reminder(client, days_stale=14)
+
+def run_lifecycle_update(full: bool):
+    hubspot, client = hubspot_client()
+    hubspot.action_lifecycle_stage_update(client)
+
+def run_deal_velocity(full: bool):
+    hubspot, client = hubspot_client()
+    hubspot.action_deal_stage_velocity(client, full=full)
+
+# needs: tasks that must succeed first; reads / writes: DuckDB files under
+# data/ the task opens; env: variables without which the task is skipped
+TASKS = {
+    "hubspot": {
+        "run": run_hubspot, "needs": [], "reads": [], "writes": [HUBSPOT_DB],
+        "env": ["HUBSPOT_ACCESS_TOKEN"],
+    },
+    "posthog": {
+        "run": run_posthog, "needs": [], "reads": [], "writes": [POSTHOG_DB],
+        "env": ["POSTHOG_API_KEY", "POSTHOG_PROJECT_ID"],
+    },
+    "athena": {
+        "run": run_athena, "needs": [], "reads": [], "writes": [ATHENA_DB],
+        "env": ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "ATHENA_OUTPUT_BUCKET", "ATHENA_DATABASE"],
+    },
+    "stale_deals": {
+        "run": run_stale_deals, "needs": ["hubspot"], "reads": [HUBSPOT_DB], "writes": [],
+        "env": ["HUBSPOT_ACCESS_TOKEN"],
+    },
+    "lifecycle_update": {
+        "run": run_lifecycle_update, "needs": ["hubspot"], "reads": [HUBSPOT_DB], "writes": [],
+        "env": ["HUBSPOT_ACCESS_TOKEN"],
+    },
+    "deal_velocity": {
+        "run": run_deal_velocity, "needs": ["hubspot"], "reads": [], "writes": [HUBSPOT_DB],
+        "env": ["HUBSPOT_ACCESS_TOKEN"],
+    },
+}
+
+def run_task(name: str, full: bool, log_path=None) -> float:
+    """
+    Run one task in this process and return its duration in seconds.
+
+    The task's output goes to `log_path` when given. A sync script exiting
+    with status 0 (e.g. nothing to refresh) counts as success.
+    """
+    sys.path.insert(0, str(Path(__file__).parent))
+    started = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        if log_path:
+            log = stack.enter_context(open(log_path, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(log))
+            stack.enter_context(contextlib.redirect_stderr(log))
+        try:
+            TASKS[name]["run"](full)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError(f"{name} exited with status {e.code}") from None
+
+    return time.perf_counter() - started
+
+
+# ----------------------------------------
+# Scheduling
+# ----------------------------------------
+
+def resolve_tasks(names: list) -> list:
+    """Return `names` plus everything they depend on, each once, dependencies first."""
+    ordered = []
+
+    def visit(name, path):
+        if name not in TASKS:
+            raise ValueError(f"Unknown task: {name}")
+        if name in path:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        if name in ordered:
+            return
+        for dependency in TASKS[name]["needs"]:
+            visit(dependency, path + [name])
+        ordered.append(name)
+
+    for name in names:
+        visit(name, [])
+    return ordered
+
+class FileLocks:
+    """Shared (read) / exclusive (write) locks on DuckDB files, held by task name."""
+
+    def __init__(self):
+        self.readers = {}
+        self.writers = {}
+
+    def available(self, task: dict) -> bool:
+        if any(self.writers.get(f) or self.readers.get(f) for f in task["writes"]):
+            return False
+        return not any(self.writers.get(f) for f in task["reads"])
+
+    def acquire(self, name: str, task: dict):
+        for f in task["writes"]:
+            self.writers[f] = name
+        for f in task["reads"]:
+            self.readers.setdefault(f, set()).add(name)
+
+    def release(self, name: str, task: dict):
+        for f in task["writes"]:
+            self.writers.pop(f, None)
+        for f in task["reads"]:
+            self.readers.get(f, set()).discard(name)
+
+def plan_order(names: list) -> list:
+    """
+    Group `names` into waves: each wave starts once the previous one has
+    finished, assuming every task takes the same time. Only used to show
+    the plan; the real run starts tasks as soon as they are ready.
+    """
+    done, waves = set(), []
+    remaining = list(names)
+    while remaining:
+        locks, wave = FileLocks(), []
+        for name in remaining:
+            task = TASKS[name]
+            if all(d in done for d in task["needs"]) and locks.available(task):
+                locks.acquire(name, task)
+                wave.append(name)
+        waves.append(wave)
+        done.update(wave)
+        remaining = [n for n in remaining if n not in done]
+    return waves
+
+def run_tasks(names: list, full: bool = False, workers: int = None, verbose: bool = False) -> dict:
+    """
+    Run `names` respecting dependencies and file locks.
+
+    Returns {task: {"status": "success" | "failed" | "skipped", "seconds", "error"}}.
+    """
+    results = {}
+    for name in names:
+        missing = [v for v in TASKS[name]["env"] if not os.environ.get(v)]
+        if missing:
+            results[name] = {"status": "skipped", "seconds": 0.0, "error": f"missing {', '.join(missing)}"}
+
+    if not verbose:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+    locks = FileLocks()
+    pending = [n for n in names if n not in results]
+    running = {}
+    started_at = {}
+
+    # A fresh process per task, so no sync inherits another's module state
+    with ProcessPoolExecutor(max_workers=workers or len(names) or 1, max_tasks_per_child=1) as pool:
+        while pending or running:
+            for name in list(pending):
+                task = TASKS[name]
+                failed = [d for d in task["needs"] if d in results and results[d]["status"] != "success"]
+                if failed:
+                    pending.remove(name)
+                    results[name] = {"status": "skipped", "seconds": 0.0,
+                                     "error": f"{', '.join(failed)} did not succeed"}
+                    print(f"Skipping {name}: {results[name]['error']}")
+                    continue
+                if all(d in results for d in task["needs"]) and locks.available(task):
+                    pending.remove(name)
+                    locks.acquire(name, task)
+                    log_path = None if verbose else str(LOG_DIR / f"{name}.log")
+                    running[pool.submit(run_task, name, full, log_path)] = name
+                    started_at[name] = time.perf_counter()
+                    print(f"Started {name}" + (f" (log: {log_path})" if log_path else ""))
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                locks.release(name, TASKS[name])
+                seconds = time.perf_counter() - started_at[name]
+                try:
+                    future.result()
+                    results[name] = {"status": "success", "seconds": seconds, "error": None}
+                    print(f"Finished {name} in {seconds:.1f}s")
+                except Exception as e:
+                    results[name] = {"status": "failed", "seconds": seconds, "error": str(e)}
+                    print(f"Failed {name} after {seconds:.1f}s: {e}")
+
+    return results
+
+
+# ----------------------------------------
+# CLI
+# ----------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all syncs and actions in dependency order")
+    parser.add_argument("tasks", nargs="*", help=f"Tasks to run ({', '.join(TASKS)}); default all")
+    parser.add_argument("--full", action="store_true", help="Re-download everything in every source")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Also write Parquet snapshots of every synced table")
+    parser.add_argument("--apply-lifecycle-updates", action="store_true",
+                        help="Write lifecycle stage updates to HubSpot instead of only logging them")
+    parser.add_argument("--workers", type=int, help="Maximum number of tasks running at once")
+    parser.add_argument("--dry-run", action="store_true", help="Show the plan without running it")
+    parser.add_argument("--verbose", action="store_true", help="Show task output instead of logging it")
+    args = parser.parse_args()
+
+    try:
+        names = resolve_tasks(args.tasks or list(TASKS))
+    except ValueError as e:
+        print(e)
+        print(f"Available tasks: {', '.join(TASKS)}")
+        sys.exit(1)
+
+    if args.dry_run:
+        for i, wave in enumerate(plan_order(names), 1):
+            print(f"{i}. {', '.join(wave)}")
+        return
+
+    if args.snapshot:
+        # Read by the sync modules when the task processes import them
+        os.environ['SYNC_SNAPSHOTS'] = '1'
+    if args.apply_lifecycle_updates:
+        os.environ['HUBSPOT_APPLY_LIFECYCLE_UPDATES'] = '1'
+
+    started = time.perf_counter()
+    results = run_tasks(names, full=args.full, workers=args.workers, verbose=args.verbose)
+
+    print(f"\nRefresh finished in {time.perf_counter() - started:.1f}s")
+    for name in names:
+        result = results[name]
+        line = f"  {name:<18} {result['status']:<8} {result['seconds']:>7.1f}s"
+        print(line + (f"  {result['error']}" if result['error'] else ""))
+
+    if any(r["status"] == "failed" for r in results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
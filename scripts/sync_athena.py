@@ -3,13 +3,28 @@
 AWS Athena Data Sync Script
 
 This script:
-1. Runs Athena queries defined in /sources/aws_athena/*.sql
-2. Waits for query completion
-3. Downloads results to local Parquet/CSV
-4. Loads into DuckDB for Evidence to query
+1. Runs Athena queries defined in /sources/aws_athena/*.sql, several at once
+2. Tracks their completion
+3. Downloads each result to local Parquet/CSV as soon as it is ready
+4. Loads it into DuckDB for Evidence to query, then deletes the download
 
 Usage:
-    python scripts/sync_athena.py [--query query_name]
+    python scripts/sync_athena.py [--query query_name] [--parquet] [--force] [--full] [--snapshot]
+    
+    --parquet UNLOADs results to Parquet instead of downloading Athena's CSV
+    --force re-runs queries even if their cached result is still fresh
+    --full reloads incremental queries from scratch
+    --snapshot also writes dated Parquet snapshots of the loaded tables to
+    data/snapshots/, with views over them in data/snapshots.duckdb
+    
+A query starting with a `-- incremental: <column> [type]` comment (e.g. a
+date partition column) only fetches rows past the largest value already
+loaded and appends them to its table. Give the column's Athena type when it
+differs from what DuckDB infers, e.g. `-- incremental: dt varchar` for a
+string partition holding dates.
+
+Each run's timings and request counts are appended to data/sync_runs.jsonl
+and to the sync_runs table.
     
 Environment Variables:
     AWS_ACCESS_KEY_ID
@@ -18,21 +33,72 @@ Environment Variables:
     ATHENA_WORKGROUP (optional, default: 'primary')
     ATHENA_OUTPUT_BUCKET (required, e.g., 's3://my-athena-results/')
     ATHENA_DATABASE (required)
+    ATHENA_MAX_CONCURRENT_QUERIES (optional, default: 5)
+    ATHENA_RESULT_FORMAT (optional, 'csv' or 'parquet', default: 'csv')
+    ATHENA_CACHE_MAX_AGE_MINUTES (optional, default: 60)
+    ATHENA_LOAD_VIA_HTTPFS (optional, read results from S3 without downloading)
+    SYNC_SNAPSHOTS (optional, write Parquet snapshots on every sync)
 """
 
 import os
 import sys
+import csv
 import time
 import glob
+import re
+import json
+import uuid
+import shutil
+import hashlib
 import boto3
 import duckdb
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 from pathlib import Path
 
+from duckdb_utils import (
+    cached_schema, columns_spec, load_first_fitting, record_schema, replace_table, snapshots_enabled,
+    write_snapshot
+)
+from sync_metrics import finish, instrument_boto_client, stage, start_run
+
 # Configuration
 SOURCES_DIR = Path(__file__).parent.parent / 'sources' / 'aws_athena'
 DATA_DIR = Path(__file__).parent.parent / 'data'
 DUCKDB_PATH = DATA_DIR / 'athena_cache.duckdb'
 
+# Query concurrency and completion polling
+MAX_CONCURRENT_QUERIES = int(os.environ.get('ATHENA_MAX_CONCURRENT_QUERIES', 5))
+DOWNLOAD_WORKERS = 4
+POLL_BATCH_SIZE = 50  # batch_get_query_execution accepts at most 50 ids
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 15.0
+
+# 'csv' downloads Athena's single CSV result; 'parquet' UNLOADs each query
+# to Parquet files that are downloaded in parallel
+RESULT_FORMAT = os.environ.get('ATHENA_RESULT_FORMAT', 'csv').lower()
+
+# boto3 already fetches large objects with parallel ranged GETs (8 MB parts,
+# 10 threads by default); larger parts mean fewer requests per result. With
+# ATHENA_LOAD_VIA_HTTPFS=1 nothing is downloaded: DuckDB streams results
+# straight from S3 through its httpfs extension.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8
+)
+LOAD_VIA_HTTPFS = os.environ.get('ATHENA_LOAD_VIA_HTTPFS', '').lower() in ('1', 'true', 'yes')
+
+# Also write Parquet snapshots of loaded tables (SYNC_SNAPSHOTS=1 or --snapshot)
+SNAPSHOTS = snapshots_enabled()
+
+# Queries whose normalized SQL is unchanged are not re-run within this many
+# minutes of their last load; Athena result reuse uses the same window
+QUERY_CACHE_PATH = DATA_DIR / 'athena_query_cache.json'
+CACHE_MAX_AGE_MINUTES = int(os.environ.get('ATHENA_CACHE_MAX_AGE_MINUTES', 60))
+
 def get_athena_client():
     return boto3.client(
         'athena',
@@ -49,35 +115,229 @@ def get_s3_client():
         region_name=os.environ.get('AWS_REGION', 'us-east-1')
     )
 
-def run_athena_query(client, query: str, database: str, workgroup: str, output_location: str) -> str:
-    """Execute Athena query and return execution ID."""
-    response = client.start_query_execution(
+def run_athena_query(client, query: str, database: str, workgroup: str, output_location: str,
+                     reuse_max_age: int = None) -> str:
+    """
+    Execute Athena query and return execution ID.
+    
+    With `reuse_max_age` (minutes) Athena may answer from a previous
+    execution's result instead of scanning again. Workgroups that do not
+    support result reuse get the query without it.
+    """
+    params = dict(
         QueryString=query,
         QueryExecutionContext={'Database': database},
         WorkGroup=workgroup,
         ResultConfiguration={'OutputLocation': output_location}
     )
+    if reuse_max_age:
+        try:
+            response = client.start_query_execution(
+                ResultReuseConfiguration={'ResultReuseByAgeConfiguration': {
+                    'Enabled': True,
+                    'MaxAgeInMinutes': reuse_max_age
+                }},
+                **params
+            )
+            return response['QueryExecutionId']
+        except client.exceptions.InvalidRequestException:
+            pass
+    
+    response = client.start_query_execution(**params)
     return response['QueryExecutionId']
 
-def wait_for_query(client, execution_id: str, poll_interval: int = 2) -> dict:
-    """Wait for query to complete and return execution details."""
-    while True:
-        response = client.get_query_execution(QueryExecutionId=execution_id)
-        state = response['QueryExecution']['Status']['State']
-        
-        if state in ('SUCCEEDED', 'FAILED', 'CANCELLED'):
-            return response['QueryExecution']
+def wrap_unload(query: str, location: str) -> str:
+    """Wrap a SELECT so Athena writes its result as Parquet files under `location`."""
+    query = query.strip().rstrip(';')
+    return f"UNLOAD (\n{query}\n) TO '{location}' WITH (format = 'PARQUET', compression = 'SNAPPY')"
+
+def execute_queries(athena, s3, queries: dict, database: str, workgroup: str,
+                    output_location: str, max_concurrent: int = MAX_CONCURRENT_QUERIES,
+                    result_format: str = RESULT_FORMAT, on_result=None,
+                    direct_s3: bool = LOAD_VIA_HTTPFS) -> dict:
+    """
+    Run all queries with at most `max_concurrent` in flight and download
+    each result as soon as its query succeeds.
+    
+    With `result_format='parquet'` each query is wrapped in UNLOAD and its
+    Parquet parts are downloaded into a directory instead of a single CSV.
+    With `direct_s3` nothing is downloaded and the result's S3 URI is
+    reported instead, for DuckDB to read through httpfs.
+    
+    Query states are polled in batches with `batch_get_query_execution`.
+    The poll interval starts at MIN_POLL_INTERVAL and backs off towards
+    MAX_POLL_INTERVAL while nothing changes.
+    
+    `on_result(name, path)` is called from this thread as soon as each
+    result is available, so it can be loaded while other queries are still
+    running. Returns {name: path} (CSV file, Parquet directory or S3 URI)
+    for every query that succeeded.
+    """
+    pending = list(queries.items())
+    running = {}
+    downloads = {}
+    results = {}
+    poll_interval = MIN_POLL_INTERVAL
+    
+    def deliver(name, path):
+        results[name] = path
+        if on_result:
+            on_result(name, path)
+    
+    def collect_downloads(futures):
+        for future in futures:
+            name, local_path = downloads.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                print(f"  Error downloading {name}: {e}")
+                continue
+            print(f"  Downloaded {name} to {local_path}")
+            deliver(name, str(local_path))
+    
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        while pending or running:
+            while pending and len(running) < max_concurrent:
+                name, sql = pending.pop(0)
+                unload_location = None
+                if result_format == 'parquet':
+                    unload_location = f"{output_location.rstrip('/')}/unload/{name}/{uuid.uuid4().hex}/"
+                    sql = wrap_unload(sql, unload_location)
+                try:
+                    # Result reuse does not apply to UNLOAD
+                    with stage("start queries"):
+                        execution_id = run_athena_query(athena, sql, database, workgroup, output_location,
+                                                        reuse_max_age=None if unload_location else CACHE_MAX_AGE_MINUTES)
+                    running[execution_id] = (name, unload_location)
+                    print(f"Started query {name}: {execution_id}")
+                except Exception as e:
+                    print(f"Error starting query {name}: {e}")
+            
+            if not running:
+                break
+            
+            with stage("wait for queries"):
+                time.sleep(poll_interval)
+            
+            finished = False
+            ids = list(running)
+            for start in range(0, len(ids), POLL_BATCH_SIZE):
+                with stage("poll queries"):
+                    response = athena.batch_get_query_execution(
+                        QueryExecutionIds=ids[start:start + POLL_BATCH_SIZE]
+                    )
+                for execution in response['QueryExecutions']:
+                    state = execution['Status']['State']
+                    if state not in ('SUCCEEDED', 'FAILED', 'CANCELLED'):
+                        continue
+                    
+                    finished = True
+                    name, unload_location = running.pop(execution['QueryExecutionId'])
+                    reuse = execution.get('Statistics', {}).get('ResultReuseInformation', {})
+                    if reuse.get('ReusedPreviousResult'):
+                        print(f"Query {name} reused a previous result")
+                    
+                    if state != 'SUCCEEDED':
+                        reason = execution['Status'].get('StateChangeReason', 'Unknown error')
+                        print(f"Query {name} {state.lower()}: {reason}")
+                    elif direct_s3:
+                        print(f"Query {name} succeeded")
+                        deliver(name, unload_location or execution['ResultConfiguration']['OutputLocation'])
+                    elif unload_location:
+                        local_dir = DATA_DIR / name
+                        future = pool.submit(download_unload_results, s3, unload_location, local_dir)
+                        downloads[future] = (name, local_dir)
+                        print(f"Query {name} succeeded, downloading Parquet results")
+                    else:
+                        output_uri = execution['ResultConfiguration']['OutputLocation']
+                        local_csv = DATA_DIR / f"{name}.csv"
+                        downloads[pool.submit(download_results, s3, output_uri, local_csv)] = (name, local_csv)
+                        print(f"Query {name} succeeded, downloading results")
+            
+            poll_interval = MIN_POLL_INTERVAL if finished else min(MAX_POLL_INTERVAL, poll_interval * 1.5)
+            
+            # Hand over finished downloads while other queries keep running
+            collect_downloads([future for future in downloads if future.done()])
         
-        time.sleep(poll_interval)
+        collect_downloads(list(as_completed(list(downloads))))
+    
+    return results
+
+def query_fingerprint(query: str) -> str:
+    """Hash of a query with comments, whitespace and trailing semicolons removed."""
+    normalized = re.sub(r'/\*.*?\*/', ' ', query, flags=re.DOTALL)
+    normalized = re.sub(r'--[^\n]*', ' ', normalized)
+    normalized = ' '.join(normalized.split()).rstrip(';').strip()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def load_query_cache() -> dict:
+    """Read {query name: fingerprint metadata} of previously loaded results."""
+    if not QUERY_CACHE_PATH.exists():
+        return {}
+    with open(QUERY_CACHE_PATH) as f:
+        return json.load(f)
+
+def save_query_cache(cache: dict):
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with open(QUERY_CACHE_PATH, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+def fresh_cached_queries(queries: dict, cache: dict, result_format: str,
+                         max_age_minutes: int = CACHE_MAX_AGE_MINUTES) -> set:
+    """
+    Return the names of queries whose loaded table can be reused as is: same
+    normalized SQL and result format, loaded less than `max_age_minutes` ago,
+    and the table still present in DuckDB.
+    """
+    if not cache or not DUCKDB_PATH.exists():
+        return set()
+    
+    con = duckdb.connect(str(DUCKDB_PATH), read_only=True)
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    con.close()
+    
+    now = datetime.utcnow()
+    fresh = set()
+    for name, sql in queries.items():
+        entry = cache.get(name)
+        if (entry and name in tables
+                and entry['fingerprint'] == query_fingerprint(sql)
+                and entry['result_format'] == result_format
+                and now - datetime.fromisoformat(entry['loaded_at']) < timedelta(minutes=max_age_minutes)):
+            fresh.add(name)
+    return fresh
 
 def download_results(s3_client, s3_uri: str, local_path: Path):
-    """Download query results from S3."""
+    """Download query results from S3 with parallel ranged GETs."""
     # Parse s3://bucket/key format
     parts = s3_uri.replace('s3://', '').split('/', 1)
     bucket = parts[0]
     key = parts[1]
     
-    s3_client.download_file(bucket, key, str(local_path))
+    with stage(f"download {local_path.stem}"):
+        s3_client.download_file(bucket, key, str(local_path), Config=TRANSFER_CONFIG)
+
+def download_unload_results(s3_client, s3_uri: str, local_dir: Path):
+    """Download every Parquet part written by an UNLOAD, in parallel."""
+    bucket, prefix = s3_uri.replace('s3://', '').split('/', 1)
+    
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Size'] > 0)
+    
+    if local_dir.exists():
+        shutil.rmtree(local_dir)
+    local_dir.mkdir(parents=True)
+    
+    with stage(f"download {local_dir.name}"), ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        futures = [
+            pool.submit(s3_client.download_file, bucket, key, str(local_dir / f"part-{i:05d}.parquet"),
+                        Config=TRANSFER_CONFIG)
+            for i, key in enumerate(keys)
+        ]
+        for future in futures:
+            future.result()
 
 def load_sql_queries() -> dict:
     """Load all .sql files from the Athena sources directory."""
@@ -88,28 +348,187 @@ def load_sql_queries() -> dict:
             queries[query_name] = f.read()
     return queries
 
-def sync_to_duckdb(csv_files: dict):
-    """Load CSV results into DuckDB."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+def read_results_sql(path: str, schema: dict = None) -> str:
+    """
+    DuckDB table function reading a result: a local CSV file or Parquet
+    directory, or (through httpfs) an S3 CSV object or UNLOAD prefix.
     
-    con = duckdb.connect(str(DUCKDB_PATH))
+    With a cached `schema` a CSV whose header still matches it is read
+    with those explicit column types instead of sniffing them from a
+    sample; otherwise known columns keep their type and only new ones are
+    sniffed.
+    """
+    if path.startswith('s3://'):
+        if path.endswith('/'):
+            return f"read_parquet('{path}*')"
+        return f"read_csv_auto('{path}')"
+    if Path(path).is_dir():
+        return f"read_parquet('{Path(path) / '*.parquet'}')"
+    if schema:
+        header = csv_header(path)
+        if header == list(schema):
+            return (f"read_csv('{path}', header=true, delim=',', quote='\"', escape='\"', "
+                    f"columns={columns_spec(schema)})")
+        known = {column: schema[column] for column in header if column in schema}
+        if known:
+            return f"read_csv_auto('{path}', types={columns_spec(known)})"
+    return f"read_csv_auto('{path}')"
+
+def csv_header(path: str) -> list:
+    """Column names in the header row of a CSV result."""
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+def configure_httpfs(con):
+    """Let DuckDB read results straight from S3 with the sync's AWS credentials."""
+    con.execute("INSTALL httpfs")
+    con.execute("LOAD httpfs")
     
-    for table_name, csv_path in csv_files.items():
-        print(f"Loading {table_name} from {csv_path}")
-        con.execute(f"DROP TABLE IF EXISTS {table_name}")
-        con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_csv_auto('{csv_path}')")
-        
-        # Verify
-        count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-        print(f"  Loaded {count} rows")
+    def quote(value):
+        return "'" + value.replace("'", "''") + "'"
+    
+    options = [
+        "TYPE S3",
+        f"KEY_ID {quote(os.environ['AWS_ACCESS_KEY_ID'])}",
+        f"SECRET {quote(os.environ['AWS_SECRET_ACCESS_KEY'])}",
+        f"REGION {quote(os.environ.get('AWS_REGION', 'us-east-1'))}",
+    ]
+    if os.environ.get('AWS_SESSION_TOKEN'):
+        options.append(f"SESSION_TOKEN {quote(os.environ['AWS_SESSION_TOKEN'])}")
+    con.execute(f"CREATE OR REPLACE SECRET athena_results ({', '.join(options)})")
+
+def remove_local_result(path: str):
+    """Delete a downloaded result once it has been loaded."""
+    local = Path(path)
+    if path.startswith('s3://') or not local.exists():
+        return
+    if local.is_dir():
+        shutil.rmtree(local)
+    else:
+        local.unlink()
+
+def incremental_column(query: str):
+    """
+    Return `(column, athena_type)` from an `-- incremental: <column> [type]`
+    header comment; `athena_type` is None when the header gives no type.
+    
+    Queries with such a header only fetch rows whose column is greater than
+    the largest value already loaded, and are appended to their table.
+    """
+    for line in query.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith('--'):
+            break
+        match = re.match(r'--\s*incremental\s*:\s*(\w+)(?:\s+(\w+))?', line, re.IGNORECASE)
+        if match:
+            return match.group(1), match.group(2) and match.group(2).lower()
+    return None
+
+def sql_literal(value, athena_type: str = None) -> str:
+    """
+    Render a Python value loaded from DuckDB as an Athena SQL literal.
+    
+    Without `athena_type` the literal's type follows the Python value, i.e.
+    the type DuckDB inferred when loading; a declared type overrides it, so
+    a string column DuckDB read as DATE is still compared as a string.
+    """
+    if athena_type in ('varchar', 'string', 'char'):
+        text = value.isoformat(sep=' ') if isinstance(value, datetime) else str(value)
+        return "'" + text.replace("'", "''") + "'"
+    if athena_type == 'date':
+        value = value.date() if isinstance(value, datetime) else value
+        return f"DATE '{value.isoformat() if isinstance(value, date) else value}'"
+    if athena_type == 'timestamp' and isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if isinstance(value, datetime):
+        return f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}'"
+    if isinstance(value, date):
+        return f"DATE '{value.isoformat()}'"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def last_loaded_values(incremental: dict) -> dict:
+    """Return {table: max(column)} for incremental tables that already hold rows."""
+    if not incremental or not DUCKDB_PATH.exists():
+        return {}
+    
+    con = duckdb.connect(str(DUCKDB_PATH), read_only=True)
+    tables = {row[0] for row in con.execute("SHOW TABLES").fetchall()}
+    
+    values = {}
+    for table_name, column in incremental.items():
+        if table_name not in tables:
+            continue
+        columns = {row[0] for row in con.execute(f"DESCRIBE {table_name}").fetchall()}
+        if column not in columns:
+            continue
+        value = con.execute(f'SELECT max("{column}") FROM {table_name}').fetchone()[0]
+        if value is not None:
+            values[table_name] = value
     
     con.close()
+    return values
+
+def incremental_query(query: str, column: str, last_value, athena_type: str = None) -> str:
+    """Restrict a query to rows past the last loaded value of `column`."""
+    query = query.strip().rstrip(';')
+    return f'SELECT * FROM (\n{query}\n) WHERE "{column}" > {sql_literal(last_value, athena_type)}'
+
+def load_result(con, table_name: str, path: str, append: bool = False,
+                snapshot: bool = SNAPSHOTS) -> int:
+    """
+    Load one query result into DuckDB, appending to or replacing its table,
+    and with `snapshot` write the table as a Parquet snapshot.
+    
+    Returns the number of rows read from the result.
+    """
+    if Path(path).is_dir() and not any(Path(path).iterdir()):
+        print(f"No new rows for {table_name}")
+        return 0
+    
+    # A local CSV reuses the column types resolved on the last load, falling
+    # back to plain inference if they no longer fit. Parquet results carry
+    # their own schema.
+    schema = cached_schema(con, table_name)
+    sources = [read_results_sql(path)]
+    if schema and Path(path).is_file():
+        sources.insert(0, read_results_sql(path, schema))
+    
+    staging = f"{table_name}__staging"
+    print(f"{'Appending to' if append else 'Loading'} {table_name} from {path}")
+    if append:
+        statement = f"INSERT INTO {table_name} BY NAME SELECT * FROM {{source}}"
+    else:
+        statement = f"CREATE OR REPLACE TABLE {staging} AS SELECT * FROM {{source}}"
+    rows = load_first_fitting(con, table_name, statement, sources)
+    
+    if not append:
+        replace_table(con, staging, table_name)
+    record_schema(con, table_name)
+    
+    # Verify
+    count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    print(f"  Loaded {count} rows")
+    if snapshot:
+        write_snapshot(con, table_name, DATA_DIR)
+    return rows
+
+def record_run(rows: int, failed: list = ()):
+    """Finish the active sync run, recording it in the cache and in data/sync_runs.jsonl."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with duckdb.connect(str(DUCKDB_PATH)) as con:
+        finish(con, DATA_DIR / 'sync_runs.jsonl', rows, status="failed" if failed else "success",
+               error=f"not loaded: {', '.join(failed)}" if failed else None)
 
 def main():
     # Parse arguments
     query_filter = None
-    if len(sys.argv) > 2 and sys.argv[1] == '--query':
-        query_filter = sys.argv[2]
+    if '--query' in sys.argv[1:-1]:
+        query_filter = sys.argv[sys.argv.index('--query') + 1]
+    result_format = 'parquet' if '--parquet' in sys.argv else RESULT_FORMAT
     
     # Validate environment
     required_vars = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'ATHENA_OUTPUT_BUCKET', 'ATHENA_DATABASE']
@@ -122,9 +541,11 @@ def main():
     workgroup = os.environ.get('ATHENA_WORKGROUP', 'primary')
     output_location = os.environ['ATHENA_OUTPUT_BUCKET']
     
+    run = start_run("athena")
+    
     # Initialize clients
-    athena = get_athena_client()
-    s3 = get_s3_client()
+    athena = instrument_boto_client(get_athena_client())
+    s3 = instrument_boto_client(get_s3_client())
     
     # Load queries
     queries = load_sql_queries()
@@ -133,41 +554,74 @@ def main():
     
     if not queries:
         print("No queries found to execute")
+        record_run(0)
         sys.exit(0)
     
-    # Execute queries
+    # Skip queries whose SQL has not changed since a recent load
+    query_cache = load_query_cache()
+    if '--force' not in sys.argv:
+        for name in sorted(fresh_cached_queries(queries, query_cache, result_format)):
+            print(f"Skipping {name}: unchanged and loaded within {CACHE_MAX_AGE_MINUTES} minutes")
+            del queries[name]
+        if not queries:
+            print("All tables are up to date")
+            record_run(0)
+            sys.exit(0)
+    
+    # Only fetch new partitions of incremental queries
+    incremental = {name: incremental_column(sql) for name, sql in queries.items()}
+    incremental = {name: header for name, header in incremental.items() if header}
+    last_values = {} if '--full' in sys.argv else last_loaded_values(
+        {name: column for name, (column, _) in incremental.items()})
+    
+    run_queries = dict(queries)
+    for name, last_value in last_values.items():
+        column, athena_type = incremental[name]
+        print(f"{name}: fetching rows with {column} > {last_value}")
+        run_queries[name] = incremental_query(queries[name], column, last_value, athena_type)
+    
+    # Execute queries, loading each result into DuckDB as soon as it is ready.
+    # The cache is only opened read-write while a result loads, so readers
+    # such as Evidence are not locked out while queries run on Athena.
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    csv_files = {}
     
-    for name, sql in queries.items():
-        print(f"\nExecuting query: {name}")
-        
+    loaded = []
+    rows = 0
+    def load(name, path):
+        nonlocal rows
+        started = time.perf_counter()
         try:
-            execution_id = run_athena_query(athena, sql, database, workgroup, output_location)
-            print(f"  Execution ID: {execution_id}")
-            
-            result = wait_for_query(athena, execution_id)
-            state = result['Status']['State']
-            
-            if state == 'SUCCEEDED':
-                # Download results
-                output_uri = result['ResultConfiguration']['OutputLocation']
-                local_csv = DATA_DIR / f"{name}.csv"
-                download_results(s3, output_uri, local_csv)
-                csv_files[name] = str(local_csv)
-                print(f"  Downloaded to {local_csv}")
-            else:
-                reason = result['Status'].get('StateChangeReason', 'Unknown error')
-                print(f"  Query failed: {reason}")
-                
+            with duckdb.connect(str(DUCKDB_PATH)) as con:
+                if LOAD_VIA_HTTPFS:
+                    configure_httpfs(con)
+                count = load_result(con, name, path, append=name in last_values,
+                                    snapshot=SNAPSHOTS or '--snapshot' in sys.argv)
+            loaded.append(name)
+            rows += count
+            run.add_stage(f"load {name}", time.perf_counter() - started, count)
         except Exception as e:
-            print(f"  Error: {e}")
+            print(f"  Error loading {name}: {e}")
+        finally:
+            remove_local_result(path)
+    
+    print(f"Executing {len(queries)} queries, up to {MAX_CONCURRENT_QUERIES} at a time")
+    execute_queries(athena, s3, run_queries, database, workgroup, output_location,
+                    result_format=result_format, on_result=load)
     
-    # Load into DuckDB
-    if csv_files:
-        print("\nLoading results into DuckDB...")
-        sync_to_duckdb(csv_files)
-        print(f"Data synced to {DUCKDB_PATH}")
+    failed = sorted(set(queries) - set(loaded))
+    record_run(rows, failed)
+    
+    if loaded:
+        print(f"\nData synced to {DUCKDB_PATH}")
+        
+        loaded_at = datetime.utcnow().isoformat()
+        for name in loaded:
+            query_cache[name] = {
+                'fingerprint': query_fingerprint(queries[name]),
+                'result_format': result_format,
+                'loaded_at': loaded_at
+            }
+        save_query_cache(query_cache)
 
 if __name__ == '__main__':
     main()
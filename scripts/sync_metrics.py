@@ -0,0 +1,232 @@
+"""
+Run metrics shared by the sync scripts.
+
+A sync script starts a run with `start_run`, wraps its stages in `stage`
+(or `timed` for page iterators) and calls `finish` at the end. HTTP requests
+made through http_utils, boto3 clients passed to `instrument_boto_client`
+and rate-limit sleeps are recorded on the active run automatically.
+
+Finished runs are appended to a JSONL log and to the `sync_runs` and
+`sync_run_stages` tables of the script's DuckDB file, so run times can be
+charted in Evidence.
+"""
+
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+_active_run = None
+
+
+class SyncRun:
+    """Timings and counters of one sync run; safe to update from many threads."""
+
+    def __init__(self, source: str):
+        self.run_id = uuid.uuid4().hex
+        self.source = source
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.latencies = []
+        self.bytes = 0
+        self.failed_requests = 0
+        self.waits = {}
+
+    def add_stage(self, name: str, seconds: float, rows: int = 0):
+        with self._lock:
+            totals = self.stages.setdefault(name, {"seconds": 0.0, "rows": 0, "calls": 0})
+            totals["seconds"] += seconds
+            totals["rows"] += rows
+            totals["calls"] += 1
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """Time the enclosed block as (part of) stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started, rows)
+
+    def record_request(self, seconds: float, nbytes: int = 0, ok: bool = True):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.bytes += nbytes
+            if not ok:
+                self.failed_requests += 1
+
+    def record_wait(self, reason: str, seconds: float):
+        with self._lock:
+            self.waits[reason] = self.waits.get(reason, 0.0) + seconds
+
+    def summary(self, rows: int = None, status: str = "success", error: str = None) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stages = {name: dict(totals, seconds=round(totals["seconds"], 3))
+                      for name, totals in self.stages.items()}
+            waits = {reason: round(seconds, 3) for reason, seconds in self.waits.items()}
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            "run_id": self.run_id,
+            "source": self.source,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.utcnow().isoformat(),
+            "status": status,
+            "error": error,
+            "duration_seconds": round(time.perf_counter() - self._started, 3),
+            "rows": rows,
+            "requests": len(latencies),
+            "failed_requests": self.failed_requests,
+            "bytes": self.bytes,
+            "http_seconds": round(sum(latencies), 3),
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            "retry_wait_seconds": waits.get("retry", 0.0),
+            "rate_limit_wait_seconds": waits.get("rate limit", 0.0),
+            "stages": stages,
+        }
+
+
+def start_run(source: str) -> SyncRun:
+    """Start recording a run of `source`; it becomes the active run."""
+    global _active_run
+    _active_run = SyncRun(source)
+    return _active_run
+
+def current_run():
+    """The active run, or None outside an instrumented sync."""
+    return _active_run
+
+def stage(name: str, rows: int = 0):
+    """Context manager timing stage `name` of the active run, if any."""
+    run = _active_run
+    return run.stage(name, rows) if run else nullcontext()
+
+def timed(iterable, name: str):
+    """Yield from `iterable`, timing each step (e.g. fetching a page) as stage `name`."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            run = _active_run
+            if run:
+                run.add_stage(name, time.perf_counter() - started)
+        yield item
+
+def record_request(seconds: float, nbytes: int = 0, ok: bool = True):
+    """Record one HTTP request on the active run, if any."""
+    run = _active_run
+    if run:
+        run.record_request(seconds, nbytes, ok)
+
+def record_wait(reason: str, seconds: float):
+    """Record time spent sleeping for `reason` ('retry', 'rate limit', ...)."""
+    run = _active_run
+    if run and seconds > 0:
+        run.record_wait(reason, seconds)
+
+def instrument_boto_client(client):
+    """Record the latency and response size of every call made by a boto3 client."""
+    def before_call(context=None, **kwargs):
+        if context is not None:
+            context["sync_metrics_started"] = time.perf_counter()
+
+    def after_call(http_response=None, context=None, **kwargs):
+        started = (context or {}).get("sync_metrics_started")
+        if started is None or http_response is None:
+            return
+        nbytes = int(http_response.headers.get("content-length") or 0)
+        record_request(time.perf_counter() - started, nbytes, http_response.status_code < 400)
+
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("after-call", after_call)
+    return client
+
+
+def create_run_tables(con):
+    """Create the tables finished runs are recorded in."""
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sync_runs (
+            run_id VARCHAR PRIMARY KEY,
+            source VARCHAR,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            status VARCHAR,
+            error VARCHAR,
+            duration_seconds DOUBLE,
+            rows BIGINT,
+            requests BIGINT,
+            failed_requests BIGINT,
+            bytes BIGINT,
+            http_seconds DOUBLE,
+            latency_p50_ms DOUBLE,
+            latency_p95_ms DOUBLE,
+            latency_max_ms DOUBLE,
+            retry_wait_seconds DOUBLE,
+            rate_limit_wait_seconds DOUBLE
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS sync_run_stages (
+            run_id VARCHAR,
+            stage VARCHAR,
+            seconds DOUBLE,
+            rows BIGINT,
+            calls BIGINT
+        )
+    """)
+
+def finish(con=None, log_path=None, rows: int = None, status: str = "success", error: str = None) -> dict:
+    """
+    Finish the active run and record it.
+
+    The summary is appended to the JSONL file `log_path` and, when a DuckDB
+    connection is given, to its sync_runs / sync_run_stages tables.
+    """
+    global _active_run
+    run = _active_run
+    if run is None:
+        return {}
+    _active_run = None
+
+    summary = run.summary(rows, status, error)
+
+    if log_path:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(summary) + "\n")
+
+    if con is not None:
+        create_run_tables(con)
+        columns = [c for c in summary if c != "stages"]
+        con.execute(
+            f"INSERT INTO sync_runs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [summary[c] for c in columns]
+        )
+        for name, totals in summary["stages"].items():
+            con.execute(
+                "INSERT INTO sync_run_stages VALUES (?, ?, ?, ?, ?)",
+                [run.run_id, name, totals["seconds"], totals["rows"], totals["calls"]]
+            )
+
+    slowest = sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"])[:3]
+    slowest = ", ".join(f"{name} {totals['seconds']}s" for name, totals in slowest)
+    print(f"Run {run.source} {status} in {summary['duration_seconds']}s: "
+          f"{summary['requests']} requests ({summary['http_seconds']}s), "
+          f"{summary['rate_limit_wait_seconds']}s rate limited, {summary['retry_wait_seconds']}s retrying"
+          + (f"; slowest stages: {slowest}" if slowest else ""))
+    return summary
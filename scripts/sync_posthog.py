@@ -5,32 +5,75 @@ PostHog API Sync Script
 This script:
 1. Queries PostHog API for events, persons, or insights
 2. Caches results locally in DuckDB
-3. Handles rate limiting and pagination
+3. Handles rate limiting and pagination, resuming interrupted syncs
 
 Note: For high-volume use cases, prefer PostHog's batch export feature
 to Postgres or S3, then connect Evidence directly to that data store.
 
 Usage:
-    python scripts/sync_posthog.py [--events] [--persons] [--insights]
+    python scripts/sync_posthog.py [--events] [--persons] [--insights] [--full] [--snapshot]
+    
+    Events are appended incrementally; --full rebuilds them from the last 7 days.
+    Each run's timings and request counts are appended to data/sync_runs.jsonl
+    and to the sync_runs table.
+    --snapshot also writes dated Parquet snapshots of the loaded tables to
+    data/snapshots/, with views over them in data/snapshots.duckdb.
     
 Environment Variables:
     POSTHOG_API_KEY (personal API key)
     POSTHOG_PROJECT_ID
     POSTHOG_HOST (optional, default: 'https://app.posthog.com')
+    SYNC_SNAPSHOTS (optional, write Parquet snapshots on every sync)
 """
 
 import os
 import sys
 import json
-import time
-import requests
 import duckdb
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from duckdb_utils import (
+    TableWriter, attached, cached_schema, clear_checkpoint, columns_spec, copy_table,
+    create_checkpoint_table, create_sync_state, get_watermark, load_checkpoint, load_first_fitting,
+    merge_table, record_schema, replace_table, save_checkpoint, set_watermark, snapshots_enabled,
+    table_exists, transaction, write_snapshot
+)
+from http_utils import RetryPolicy, RetryStats, get_shared_session, request_with_retry
+from sync_metrics import finish, stage, start_run, timed
+
 # Configuration
 DATA_DIR = Path(__file__).parent.parent / 'data'
 DUCKDB_PATH = DATA_DIR / 'posthog_cache.duckdb'
+# Exports are staged here, so the cache is only locked while they are swapped in
+STAGING_PATH = DATA_DIR / 'posthog_staging.duckdb'
+
+# PostHog throttles query endpoints per minute, so allow longer waits
+RETRY_POLICY = RetryPolicy(max_attempts=6, base_delay=5.0, max_delay=120.0)
+RETRY_STATS = RetryStats()
+
+# Event export: columns pulled per event, rows per HogQL page, and how the
+# time range is split into concurrently exported windows
+EVENT_COLUMNS = {
+    'uuid': 'VARCHAR',
+    'event': 'VARCHAR',
+    'distinct_id': 'VARCHAR',
+    'properties': 'JSON',
+    'timestamp': 'TIMESTAMP',
+    'person_id': 'VARCHAR',
+}
+EVENT_PAGE_SIZE = 10000
+MAX_EVENTS_PER_WINDOW = 100000
+INITIAL_EVENT_WINDOW = timedelta(days=1)
+MIN_EVENT_WINDOW = timedelta(minutes=1)
+
+# Incremental event syncs re-fetch this much before the last synced event
+EVENT_OVERLAP = timedelta(minutes=10)
+EXPORT_WORKERS = 4
+
+# Also write Parquet snapshots of loaded tables (SYNC_SNAPSHOTS=1 or --snapshot)
+SNAPSHOTS = snapshots_enabled()
 
 def get_config():
     return {
@@ -40,84 +83,289 @@ def get_config():
     }
 
 def make_request(config, endpoint, params=None, method='GET', json_data=None):
-    """Make authenticated request to PostHog API."""
-    url = f"{config['host']}/api/projects/{config['project_id']}/{endpoint}"
+    """
+    Make authenticated request to PostHog API.
+    
+    `endpoint` is relative to the project, or an absolute URL such as the
+    `next` link of a paginated response.
+    """
+    if endpoint.startswith(('http://', 'https://')):
+        url = endpoint
+    else:
+        url = f"{config['host']}/api/projects/{config['project_id']}/{endpoint}"
     headers = {'Authorization': f"Bearer {config['api_key']}"}
     
-    response = requests.request(
-        method=method,
-        url=url,
+    response = request_with_retry(
+        get_shared_session(),
+        method,
+        url,
+        policy=RETRY_POLICY,
+        stats=RETRY_STATS,
         headers=headers,
         params=params,
         json=json_data
     )
-    
-    # Handle rate limiting
-    if response.status_code == 429:
-        retry_after = int(response.headers.get('Retry-After', 60))
-        print(f"Rate limited. Waiting {retry_after} seconds...")
-        time.sleep(retry_after)
-        return make_request(config, endpoint, params, method, json_data)
-    
-    response.raise_for_status()
     return response.json()
 
-def fetch_events(config, days_back=7, event_names=None):
-    """Fetch events from PostHog API."""
-    # Note: The events API is deprecated. Use HogQL query instead.
-    after = (datetime.utcnow() - timedelta(days=days_back)).isoformat() + 'Z'
-    
-    # Use query API with HogQL
-    query = f"""
-    SELECT 
-        uuid,
-        event,
-        distinct_id,
-        properties,
-        timestamp,
-        person_id
-    FROM events
-    WHERE timestamp >= '{after}'
-    """
-    
+def event_filter_sql(start: datetime, end: datetime, event_names=None) -> str:
+    """HogQL WHERE clause selecting events in [start, end)."""
+    clause = (f"timestamp >= '{start.isoformat()}Z' "
+              f"AND timestamp < '{end.isoformat()}Z'")
     if event_names:
         event_list = "', '".join(event_names)
-        query += f" AND event IN ('{event_list}')"
-    
-    query += " ORDER BY timestamp DESC LIMIT 10000"
-    
+        clause += f" AND event IN ('{event_list}')"
+    return clause
+
+def run_hogql(config, query):
+    """Run a HogQL query and return its result rows."""
     result = make_request(
         config, 
         'query',
         method='POST',
         json_data={'query': {'kind': 'HogQLQuery', 'query': query}}
     )
-    
     return result.get('results', [])
 
-def fetch_persons(config, limit=1000):
-    """Fetch persons from PostHog API."""
-    all_persons = []
-    next_url = None
+def count_events(config, start, end, event_names=None) -> int:
+    """Count events in [start, end)."""
+    rows = run_hogql(config, f"SELECT count() FROM events WHERE {event_filter_sql(start, end, event_names)}")
+    return int(rows[0][0]) if rows else 0
+
+def plan_event_windows(config, start, end, event_names=None,
+                       max_rows=MAX_EVENTS_PER_WINDOW) -> list:
+    """
+    Split [start, end) into windows of at most `max_rows` events each.
+    
+    The range is first cut into day-sized windows; any window holding more
+    than `max_rows` events is halved until it fits or reaches the minimum
+    window length. Returns `(start, end, count)` tuples for non-empty windows.
+    """
+    pending = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + INITIAL_EVENT_WINDOW, end)
+        pending.append((window_start, window_end))
+        window_start = window_end
+    
+    windows = []
+    while pending:
+        window_start, window_end = pending.pop()
+        count = count_events(config, window_start, window_end, event_names)
+        if count > max_rows and window_end - window_start > MIN_EVENT_WINDOW:
+            middle = window_start + (window_end - window_start) / 2
+            pending.extend([(window_start, middle), (middle, window_end)])
+        elif count:
+            windows.append((window_start, window_end, count))
+    
+    return sorted(windows)
+
+def iter_event_pages(config, start, end, event_names=None, page_size=EVENT_PAGE_SIZE):
+    """
+    Yield all events in [start, end) in pages of at most `page_size` rows.
+    
+    Pages are keyset-paginated on (timestamp, uuid), so no page is limited
+    by the HogQL result cap and no offset has to be rescanned.
+    """
+    last = None
     
+    while True:
+        where = event_filter_sql(start, end, event_names)
+        if last:
+            where += (f" AND (timestamp > '{last[0]}' OR "
+                      f"(timestamp = '{last[0]}' AND uuid > toUUID('{last[1]}')))")
+        
+        rows = run_hogql(config, f"""
+        SELECT {', '.join(EVENT_COLUMNS)}
+        FROM events
+        WHERE {where}
+        ORDER BY timestamp, uuid
+        LIMIT {page_size}
+        """)
+        if not rows:
+            break
+        
+        page = [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+        yield page
+        
+        if len(rows) < page_size:
+            break
+        last = (page[-1]['timestamp'], page[-1]['uuid'])
+
+def fetch_events(config, days_back=7, event_names=None):
+    """Fetch events from PostHog API."""
+    # Note: The events API is deprecated. Use HogQL query instead.
+    end = datetime.utcnow()
+    start = end - timedelta(days=days_back)
+    
+    events = []
+    for page in iter_event_pages(config, start, end, event_names):
+        events.extend(page)
+    return events
+
+def sync_events(config, days_back=7, event_names=None, workers=EXPORT_WORKERS, full=False,
+                snapshot=SNAPSHOTS):
+    """
+    Export events into the long-lived posthog_events table.
+    
+    Incremental by default: only events newer than the last synced timestamp
+    (minus EVENT_OVERLAP, to catch late-ingested events) are fetched and
+    merged in, deduplicated on uuid. A first run or `full` rebuilds the table
+    from the last `days_back` days.
+    
+    The range is split into windows (see `plan_event_windows`) that are
+    exported concurrently; each worker streams its pages into a staging
+    table in STAGING_PATH through its own DuckDB cursor. The cache is only
+    attached once the export is done, to merge or swap that table in.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    table_name = 'posthog_events'
+    staging = f'{table_name}__staging'
+    
+    with duckdb.connect(str(DUCKDB_PATH)) as con:
+        create_sync_state(con)
+        watermark = None if full else get_watermark(con, table_name)
+    
+    end = datetime.utcnow()
+    if watermark:
+        start = datetime.fromisoformat(watermark) - EVENT_OVERLAP
+        print(f"Fetching events since {start.isoformat()}Z...")
+    else:
+        start = end - timedelta(days=days_back)
+    
+    with stage("plan event windows"):
+        windows = plan_event_windows(config, start, end, event_names)
+    expected = sum(count for _, _, count in windows)
+    print(f"Exporting {expected} events in {len(windows)} windows...")
+    
+    column_defs = ", ".join(f"{name} {column_type}" for name, column_type in EVENT_COLUMNS.items())
+    work = duckdb.connect(str(STAGING_PATH))
+    work.execute(f"DROP TABLE IF EXISTS {staging}")
+    work.execute(f"CREATE TABLE {staging} ({column_defs})")
+    
+    def export_window(cursor, window_start, window_end):
+        writer = TableWriter(cursor, staging, replace=False)
+        for page in timed(iter_event_pages(config, window_start, window_end, event_names), "fetch events"):
+            with stage("load events", rows=len(page)):
+                writer.write(page)
+        cursor.close()
+        return writer.rows_written
+    
+    exported = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(export_window, work.cursor(), window_start, window_end)
+            for window_start, window_end, _ in windows
+        ]
+        for future in as_completed(futures):
+            exported += future.result()
+            print(f"  Exported {exported}/{expected} events...")
+    
+    with attached(work, DUCKDB_PATH, "cache") as con:
+        copy_table(con, work, staging)
+        if watermark:
+            with stage("merge events"):
+                merge_table(con, staging, table_name, key='uuid')
+            print(f"Merged {exported} recent rows into {table_name}")
+        else:
+            with stage("swap events"):
+                replace_table(con, staging, table_name)
+            print(f"Saved {exported} rows to {table_name}")
+        
+        latest = con.execute(f"SELECT max(timestamp) FROM {table_name}").fetchone()[0]
+        if latest:
+            set_watermark(con, table_name, latest.isoformat())
+        if snapshot:
+            write_snapshot(con, table_name, DATA_DIR)
+    work.execute(f"DROP TABLE {staging}")
+    work.close()
+    return exported
+
+def iter_person_pages(config, page_size=100, next_url=None):
+    """
+    Yield pages of persons as `(persons, next_url)`.
+    
+    `next_url` is None after the last page; passing it back resumes there.
+    """
     while True:
         if next_url:
-            # Parse next URL for pagination
-            response = requests.get(next_url, headers={'Authorization': f"Bearer {config['api_key']}"})
-            response.raise_for_status()
-            data = response.json()
+            data = make_request(config, next_url)
         else:
-            data = make_request(config, 'persons', {'limit': min(limit, 100)})
+            data = make_request(config, 'persons', {'limit': page_size})
         
-        all_persons.extend(data.get('results', []))
+        next_url = data.get('next')
+        yield data.get('results', []), next_url
         
-        if len(all_persons) >= limit or not data.get('next'):
+        if not next_url:
+            break
+
+def fetch_persons(config, limit=1000):
+    """Fetch persons from PostHog API."""
+    all_persons = []
+    
+    for page, _ in iter_person_pages(config, page_size=min(limit, 100)):
+        all_persons.extend(page)
+        if len(all_persons) >= limit:
             break
-            
-        next_url = data['next']
     
     return all_persons[:limit]
 
+def sync_persons(config, limit=1000, snapshot=SNAPSHOTS):
+    """
+    Stream persons into the posthog_persons table page by page.
+    
+    Pages are staged in STAGING_PATH, each committed together with the
+    `next` URL, so a failed sync resumes from the last committed page on
+    the next run. After the last page the checkpoint's URL is None and a
+    resume only swaps the table into the cache.
+    """
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    table_name = 'posthog_persons'
+    staging = f'{table_name}__staging'
+    
+    with duckdb.connect(str(DUCKDB_PATH)) as con:
+        schema = cached_schema(con, table_name)
+    
+    work = duckdb.connect(str(STAGING_PATH))
+    create_checkpoint_table(work)
+    checkpoint = load_checkpoint(work, table_name, staging)
+    
+    if checkpoint:
+        print(f"Resuming after {checkpoint['rows_fetched']} persons...")
+        writer = TableWriter(work, staging, schema, replace=False)
+        writer.rows_written = checkpoint['rows_fetched']
+        next_url = checkpoint['cursor']['next']
+        done = next_url is None
+    else:
+        writer = TableWriter(work, staging, schema)
+        next_url, done = None, False
+    
+    if writer.rows_written < limit and not done:
+        pages = iter_person_pages(config, min(limit, 100), next_url)
+        for page, next_url in timed(pages, "fetch persons"):
+            page = page[:limit - writer.rows_written]
+            
+            with stage("load persons", rows=len(page)):
+                with transaction(work):
+                    writer.write(page)
+                    save_checkpoint(work, table_name, 'full', {'next': next_url}, writer.rows_written)
+            
+            if writer.rows_written >= limit:
+                break
+    
+    if table_exists(work, staging):
+        with attached(work, DUCKDB_PATH, "cache") as con:
+            with stage("swap persons"):
+                copy_table(con, work, staging)
+                replace_table(con, staging, table_name)
+            record_schema(con, table_name)
+            print(f"Saved {writer.rows_written} rows to {table_name}")
+            if snapshot:
+                write_snapshot(con, table_name, DATA_DIR)
+    clear_checkpoint(work, table_name, staging)
+    
+    work.close()
+    return writer.rows_written
+
 def fetch_insights(config, insight_ids=None):
     """Fetch saved insights from PostHog."""
     if insight_ids:
@@ -129,7 +377,7 @@ def fetch_insights(config, insight_ids=None):
     else:
         return make_request(config, 'insights', {'limit': 100}).get('results', [])
 
-def save_to_duckdb(data, table_name):
+def save_to_duckdb(data, table_name, snapshot=SNAPSHOTS):
     """Save data to DuckDB table."""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     
@@ -140,22 +388,37 @@ def save_to_duckdb(data, table_name):
     with open(json_path, 'w') as f:
         json.dump(data, f)
     
-    con.execute(f"DROP TABLE IF EXISTS {table_name}")
-    con.execute(f"CREATE TABLE {table_name} AS SELECT * FROM read_json_auto('{json_path}')")
+    # Reuse the schema resolved on the last load unless the keys changed,
+    # so types don't depend on what DuckDB happens to sample this time
+    schema = cached_schema(con, table_name)
+    keys = {key for row in data for key in row}
+    sources = [f"read_json_auto('{json_path}')"]
+    if schema and set(schema) == keys:
+        sources.insert(0, f"read_json('{json_path}', format='array', columns={columns_spec(schema)})")
+    
+    staging = f"{table_name}__staging"
+    load_first_fitting(con, table_name, f"CREATE OR REPLACE TABLE {staging} AS SELECT * FROM {{source}}", sources)
+    replace_table(con, staging, table_name)
+    record_schema(con, table_name)
     
     count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
     print(f"Saved {count} rows to {table_name}")
+    if snapshot:
+        write_snapshot(con, table_name, DATA_DIR)
     
     con.close()
     
     # Clean up JSON file
     json_path.unlink()
+    return count
 
 def main():
     # Parse arguments
-    sync_events = '--events' in sys.argv or len(sys.argv) == 1
-    sync_persons = '--persons' in sys.argv or len(sys.argv) == 1
-    sync_insights = '--insights' in sys.argv
+    selected = [a for a in sys.argv[1:] if a in ('--events', '--persons', '--insights')]
+    want_events = '--events' in sys.argv or not selected
+    want_persons = '--persons' in sys.argv or not selected
+    want_insights = '--insights' in sys.argv
+    snapshot = SNAPSHOTS or '--snapshot' in sys.argv
     
     # Validate environment
     config = get_config()
@@ -164,32 +427,44 @@ def main():
         sys.exit(1)
     
     print(f"Syncing PostHog data from {config['host']}")
+    start_run("posthog")
+    rows, errors = 0, []
     
-    if sync_events:
+    if want_events:
         print("\nFetching events...")
         try:
-            events = fetch_events(config, days_back=7)
-            save_to_duckdb(events, 'posthog_events')
+            rows += sync_events(config, days_back=7, full='--full' in sys.argv, snapshot=snapshot)
         except Exception as e:
             print(f"Error fetching events: {e}")
+            errors.append(f"events: {e}")
     
-    if sync_persons:
+    if want_persons:
         print("\nFetching persons...")
         try:
-            persons = fetch_persons(config, limit=1000)
-            save_to_duckdb(persons, 'posthog_persons')
+            rows += sync_persons(config, limit=1000, snapshot=snapshot)
         except Exception as e:
             print(f"Error fetching persons: {e}")
+            errors.append(f"persons: {e}")
     
-    if sync_insights:
+    if want_insights:
         print("\nFetching insights...")
         try:
-            insights = fetch_insights(config)
-            save_to_duckdb(insights, 'posthog_insights')
+            with stage("fetch insights"):
+                insights = fetch_insights(config)
+            with stage("load insights", rows=len(insights)):
+                rows += save_to_duckdb(insights, 'posthog_insights', snapshot=snapshot)
         except Exception as e:
             print(f"Error fetching insights: {e}")
+            errors.append(f"insights: {e}")
     
     print(f"\nData synced to {DUCKDB_PATH}")
+    print(f"API usage: {RETRY_STATS.summary()}")
+    
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(DUCKDB_PATH))
+    finish(con, DATA_DIR / 'sync_runs.jsonl', rows,
+           status="failed" if errors else "success", error="; ".join(errors) or None)
+    con.close()
 
 if __name__ == '__main__':
     main()